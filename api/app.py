@@ -9,12 +9,14 @@ import os
 import shutil
 import subprocess
 import tempfile
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
 
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from sse_starlette.sse import EventSourceResponse
 from pydantic import BaseModel
@@ -30,10 +32,47 @@ from pipeline.nodes.risk_gate_node import risk_gate_node
 from pipeline.nodes.migrator_node import migrator_node
 from pipeline.nodes.validator_node import validator_node
 from pipeline.nodes.reporter_node import reporter_node
-from storage.memory import RepoMemory
+from storage import vector_store
+from storage.memory import get_repo_memory
+
+
+# orjson is a speedup, not a requirement — dict-returning endpoints serialise
+# through it when present, stdlib json otherwise
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as _DefaultResponse
+except ImportError:
+    _DefaultResponse = JSONResponse
+
+
+# ─── Startup warm-up ──────────────────────────────────────────────────────────
+
+def _warm_up() -> None:
+    for name, fn in (
+        ("pipeline graph", get_pipeline),
+        ("vector store", vector_store.warm_up),
+    ):
+        try:
+            fn()
+        except Exception as e:
+            print(f"[api] ⚠ Warm-up of {name} failed (non-fatal): {e}")
+    print("[api] ✓ Warm-up complete")
+
+
+_warm_up_task: Optional[asyncio.Task] = None
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Off the loop and not awaited: the server takes requests while this runs
+    global _warm_up_task
+    _warm_up_task = asyncio.create_task(asyncio.to_thread(_warm_up))
+    yield
 
 
 app = FastAPI(
+    lifespan=_lifespan,
+    default_response_class=_DefaultResponse,
     title="BehaviorLock",
     description="AI modernization copilot that proves behavior is preserved while migrating legacy systems.",
     version="0.1.0",
@@ -49,7 +88,39 @@ app.add_middleware(
 
 # ─── In-memory session store (demo-grade) ─────────────────────────────────────
 # In prod: replace with Redis or DB
-_sessions: dict[str, PipelineState] = {}
+
+class _SessionStore(OrderedDict):
+    """
+    Session dict that keeps only the `cap` most recently used entries.
+    Each state carries whole source trees, patches and test suites, so an
+    unbounded dict grows for the life of the process. Writes and lookups both
+    move the session to the back, so a session that is being polled or
+    written to outlives `cap` idle ones; an untouched one can still age out.
+    """
+    def __init__(self, cap: int):
+        super().__init__()
+        self.cap = cap
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.cap:
+            self.popitem(last=False)
+
+
+_MAX_SESSIONS = int(os.environ.get("BLOC_MAX_SESSIONS", "200"))
+_sessions: dict[str, PipelineState] = _SessionStore(_MAX_SESSIONS)
 
 
 # ─── Models ───────────────────────────────────────────────────────────────────
@@ -95,7 +166,7 @@ async def ingest_upload(file: UploadFile = File(...)):
     zip_path = Path(tmp_dir) / file.filename
 
     content = await file.read()
-    zip_path.write_bytes(content)
+    await asyncio.to_thread(zip_path.write_bytes, content)
 
     import uuid
     session_id = str(uuid.uuid4())[:8]
@@ -147,7 +218,9 @@ async def run_full_pipeline(session_id: str, target_module: Optional[str] = None
                 # event is a dict mapping node_name -> output_state
                 for node_name, output_state in event.items():
                     print(f"[api] Node {node_name} finished")
-                    _sessions[session_id] = PipelineState(**output_state)
+                    # Validating a full state (sources, patches, test suites) is real CPU —
+                    # keep it off the loop that's serving /stream and the stage endpoints
+                    _sessions[session_id] = await asyncio.to_thread(PipelineState.model_validate, output_state)
         except Exception as e:
             print(f"[api] Pipeline Error: {e}")
             session.error = str(e)
@@ -263,7 +336,7 @@ def get_tests(session_id: str):
     state = _get_state(session_id)
     if not state.test_suite:
         raise HTTPException(404, "Test suite not yet generated.")
-    return state.test_suite.model_dump()
+    return _model_response(state.test_suite)
 
 
 @app.get("/dead-code/{session_id}", summary="Get dead code report")
@@ -271,7 +344,7 @@ def get_dead_code(session_id: str):
     state = _get_state(session_id)
     if not state.dead_code_report:
         raise HTTPException(404, "Dead code report not yet generated.")
-    return state.dead_code_report.model_dump()
+    return _model_response(state.dead_code_report)
 
 
 @app.get("/baseline/{session_id}", summary="Get baseline run results")
@@ -279,7 +352,7 @@ def get_baseline(session_id: str):
     state = _get_state(session_id)
     if not state.baseline_run:
         raise HTTPException(404, "Baseline run not yet executed.")
-    return state.baseline_run.model_dump()
+    return _model_response(state.baseline_run)
 
 
 @app.get("/risk/{session_id}", summary="Get risk assessment")
@@ -287,7 +360,7 @@ def get_risk(session_id: str):
     state = _get_state(session_id)
     if not state.risk_assessment:
         raise HTTPException(404, "Risk assessment not yet computed.")
-    return state.risk_assessment.model_dump()
+    return _model_response(state.risk_assessment)
 
 
 @app.post("/override-risk/{session_id}", summary="Override risk block and continue pipeline")
@@ -305,7 +378,8 @@ async def override_risk(session_id: str):
             # Run remaining nodes sequentially: migrator → validator → reporter
             ps = state
             for node_fn in [migrator_node, validator_node, reporter_node]:
-                ps = node_fn(ps)
+                # Nodes are sync and run for minutes (LLM calls, pytest) — keep them off the loop
+                ps = await asyncio.to_thread(node_fn, ps)
                 _sessions[session_id] = ps
                 if ps.error:
                     break
@@ -317,8 +391,11 @@ async def override_risk(session_id: str):
     return {"status": "overridden", "session_id": session_id}
 
 
+# Sync handlers below: they only do blocking file/subprocess work, so FastAPI
+# runs them in its threadpool instead of stalling the event loop.
+
 @app.post("/apply/{session_id}", summary="Apply migration changes back to source")
-async def apply_migration(session_id: str):
+def apply_migration(session_id: str):
     """Overwrite the original repo files with the migrated ones."""
     state = _get_state(session_id)
     if not state.migrated_repo_path:
@@ -336,6 +413,8 @@ async def apply_migration(session_id: str):
             if item.is_file() and "_bloc_tests" not in str(item):
                 rel = item.relative_to(src)
                 target = dst / rel
+                if target.exists() and os.path.samefile(item, target):
+                    continue  # hardlinked by the migrator and never rewritten — already identical
                 target.parent.mkdir(parents=True, exist_ok=True)
                 shutil.copy2(item, target)
         
@@ -345,7 +424,7 @@ async def apply_migration(session_id: str):
 
 
 @app.post("/create-pr/{session_id}", summary="Apply migration and create GitHub PR")
-async def create_pr(session_id: str):
+def create_pr(session_id: str):
     """Create a branch, apply migrated files, commit, push, and open a GitHub PR."""
     state = _get_state(session_id)
     default_branch = os.environ.get("GIT_DEFAULT_BRANCH", "main")
@@ -396,6 +475,8 @@ async def create_pr(session_id: str):
             if item.is_file() and "_bloc_tests" not in str(item):
                 rel = item.relative_to(src)
                 target = repo / rel
+                if target.exists() and os.path.samefile(item, target):
+                    continue  # hardlinked by the migrator and never rewritten — already identical
                 target.parent.mkdir(parents=True, exist_ok=True)
                 shutil.copy2(item, target)
 
@@ -520,7 +601,7 @@ def get_patch(session_id: str):
     state = _get_state(session_id)
     if not state.migration_patch:
         raise HTTPException(404, "Migration patch not yet generated.")
-    return state.migration_patch.model_dump()
+    return _model_response(state.migration_patch)
 
 
 @app.get("/validation/{session_id}", summary="Get validation results + drift report")
@@ -528,7 +609,7 @@ def get_validation(session_id: str):
     state = _get_state(session_id)
     if not state.validation_result:
         raise HTTPException(404, "Validation not yet run.")
-    return state.validation_result.model_dump()
+    return _model_response(state.validation_result)
 
 
 @app.get("/report/{session_id}", summary="Get final confidence report")
@@ -536,7 +617,7 @@ def get_report(session_id: str):
     state = _get_state(session_id)
     if not state.confidence_report:
         raise HTTPException(404, "Report not yet generated.")
-    return state.confidence_report.model_dump()
+    return _model_response(state.confidence_report)
 
 
 @app.get("/status/{session_id}", summary="Get pipeline status")
@@ -580,6 +661,14 @@ def _get_state(session_id: str) -> PipelineState:
     return state
 
 
+def _model_response(model: BaseModel) -> Response:
+    """
+    Stage model → JSON bytes in one pydantic-core pass. Returning model_dump()
+    would build a dict only for FastAPI to walk it again in jsonable_encoder.
+    """
+    return Response(model.model_dump_json(), media_type="application/json")
+
+
 
 # ══════════════════════════════════════════════════════════════════════════════
 # DOCGEN PIPELINE — 4-agent documentation generator + human-in-the-loop
@@ -587,10 +676,18 @@ def _get_state(session_id: str) -> PipelineState:
 
 from datetime import datetime, timezone
 from models.docgen_state import DocGenState, DocGenRequest, HumanReview, ApprovalRequest
-from pipeline.docgen_graph import run_docgen_pipeline
+from pipeline.docgen_graph import iter_docgen_pipeline
 from utils.notifications import send_discord_notification
 
-_docgen_sessions: dict[str, DocGenState] = {}
+_docgen_sessions: dict[str, DocGenState] = _SessionStore(_MAX_SESSIONS)
+
+
+def _run_docgen_tracked(session_id: str, doc_state: DocGenState) -> DocGenState:
+    """Run the doc pipeline, publishing each step's state so /docgen/stream sees progress live."""
+    result = doc_state
+    for result in iter_docgen_pipeline(doc_state):
+        _docgen_sessions[session_id] = result
+    return result
 
 
 
@@ -610,8 +707,7 @@ async def docgen_run(session_id: str):
     _docgen_sessions[session_id] = doc_state
 
     loop = asyncio.get_event_loop()
-    result: DocGenState = await loop.run_in_executor(None, run_docgen_pipeline, doc_state)
-    _docgen_sessions[session_id] = result
+    result: DocGenState = await loop.run_in_executor(None, _run_docgen_tracked, session_id, doc_state)
 
     # ── Notify Discord ────────────────────────────────────────────────
     if not result.error and result.proofread_output:
@@ -647,8 +743,7 @@ async def docgen_run_direct(req: DocGenRequest):
     _docgen_sessions[session_id] = doc_state
 
     loop = asyncio.get_event_loop()
-    result: DocGenState = await loop.run_in_executor(None, run_docgen_pipeline, doc_state)
-    _docgen_sessions[session_id] = result
+    result: DocGenState = await loop.run_in_executor(None, _run_docgen_tracked, session_id, doc_state)
 
     # ── Notify Discord ────────────────────────────────────────────────
     if not result.error and result.proofread_output:
@@ -671,6 +766,41 @@ async def docgen_run_direct(req: DocGenRequest):
     }
 
 
+@app.get("/docgen/stream/{session_id}")
+async def docgen_stream(session_id: str, request: Request):
+    """
+    Server-Sent Events for a docgen run: one event per stage change, so the UI
+    can render progress while /docgen/run is still waiting on the LLM agents.
+    """
+    async def event_generator():
+        last_stage = None
+        while True:
+            if await request.is_disconnected():
+                break
+
+            state = _docgen_sessions.get(session_id)
+            if not state:
+                yield {"event": "error", "data": f"DocGen session {session_id} not found"}
+                break
+
+            done = state.current_stage == "awaiting_review" or bool(state.error)
+            if state.current_stage != last_stage or done:
+                event_data = {"stage": state.current_stage, "error": state.error, "done": done}
+                if state.qa_output:
+                    event_data["qa_score"] = state.qa_output.qa_score
+                if state.proofread_output:
+                    event_data["word_count"] = state.proofread_output.word_count
+                yield {"data": event_data}
+                last_stage = state.current_stage
+
+            if done:
+                break
+
+            await asyncio.sleep(0.5)
+
+    return EventSourceResponse(event_generator())
+
+
 @app.get("/docgen/draft/{session_id}")
 def docgen_draft(session_id: str):
     """Get the final proofread markdown (ready for human review)."""
@@ -727,7 +857,7 @@ def docgen_approve(session_id: str, req: ApprovalRequest):
         # ── Persist approved doc to memory ────────────────────────────────
         if state.repo_path:
             try:
-                mem = RepoMemory(state.repo_path)
+                mem = get_repo_memory(state.repo_path)
                 mem.record_approved_doc(session_id, state.proofread_output.final_markdown)
                 mem.record_docgen_run(
                     session_id=session_id,
@@ -763,7 +893,7 @@ def docgen_status(session_id: str):
 def memory_stats(repo_path: str):
     """What has B.LOC learned about this repo so far?"""
     try:
-        mem = RepoMemory(repo_path)
+        mem = get_repo_memory(repo_path)
         return mem.stats()
     except Exception as e:
         raise HTTPException(500, str(e))
@@ -773,7 +903,7 @@ def memory_stats(repo_path: str):
 def memory_drifts(repo_path: str):
     """All drift patterns observed for this repo across runs."""
     try:
-        mem = RepoMemory(repo_path)
+        mem = get_repo_memory(repo_path)
         return {"repo_id": mem.repo_id, "drifts": mem.known_drifts()}
     except Exception as e:
         raise HTTPException(500, str(e))
@@ -783,7 +913,7 @@ def memory_drifts(repo_path: str):
 def memory_runs(repo_path: str, limit: int = 10):
     """Migration run history for this repo."""
     try:
-        mem = RepoMemory(repo_path)
+        mem = get_repo_memory(repo_path)
         return {"repo_id": mem.repo_id, "runs": mem.past_runs(limit)}
     except Exception as e:
         raise HTTPException(500, str(e))
@@ -793,7 +923,7 @@ def memory_runs(repo_path: str, limit: int = 10):
 def memory_docs(repo_path: str, limit: int = 5):
     """DocGen history for this repo."""
     try:
-        mem = RepoMemory(repo_path)
+        mem = get_repo_memory(repo_path)
         return {"repo_id": mem.repo_id, "docgen_history": mem.docgen_history(limit)}
     except Exception as e:
         raise HTTPException(500, str(e))
@@ -806,7 +936,7 @@ def memory_search(repo_path: str, q: str, kind: str = "functions"):
     kind: functions | drifts | biz_logic | docs
     """
     try:
-        mem = RepoMemory(repo_path)
+        mem = get_repo_memory(repo_path)
         dispatch = {
             "functions": mem.search_functions,
             "drifts":    mem.search_drifts,
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Optional, Literal
+from typing import Annotated, Optional, Literal
 from pydantic import BaseModel, Field
 
 
@@ -95,12 +95,18 @@ class ApprovalRequest(BaseModel):
 
 # ─── Master DocGen state ──────────────────────────────────────────────────────
 
+def _keep_fetched(current: Optional[str], update: Optional[str]) -> Optional[str]:
+    """Reducer for fields written by parallel branches: a branch echoing None must not clobber a fetched value."""
+    return update if update is not None else current
+
+
 class DocGenState(BaseModel):
     # Input
     session_id: str
     repo_path: str
     target_module: Optional[str] = None
     source_code: str = ""        # raw source passed to scanner
+    source_summary: str = ""     # AST outline of source_code, built once by scanner
 
     # Stage outputs
     scanner_output: Optional[ScannerOutput] = None
@@ -108,6 +114,9 @@ class DocGenState(BaseModel):
     qa_output: Optional[QAOutput] = None
     proofread_output: Optional[ProofreadOutput] = None
 
+    # Biz-logic memory for QA, prefetched alongside the writer (None = not fetched yet)
+    qa_memory_biz: Annotated[Optional[str], _keep_fetched] = None
+
     # Human review
     human_review: HumanReview = Field(default_factory=lambda: HumanReview(status="pending"))
 
@@ -74,7 +74,8 @@ class PatchChange(BaseModel):
 
 
 class MigrationPatch(BaseModel):
-    unified_diff: str               # full unified diff string
+    unified_diff: str               # unified diff (first 200 lines when large)
+    unified_diff_path: Optional[str] = None  # full unified diff on disk
     changes: list[PatchChange]
     lint_passed: bool
     lint_errors: list[str]
@@ -1,15 +1,17 @@
 """
 DocGen Pipeline — LangGraph StateGraph
-Scanner → Writer → QA → Proofreader → [awaiting human review]
+Scanner → (Writer ∥ QA memory prefetch) → QA → Proofreader → [awaiting human review]
 """
 
 from __future__ import annotations
+from typing import Iterator
+
 from langgraph.graph import StateGraph, END
 
 from models.docgen_state import DocGenState
 from pipeline.nodes.docgen_scanner_node import scanner_node
 from pipeline.nodes.docgen_writer_node import writer_node
-from pipeline.nodes.docgen_qa_node import qa_node
+from pipeline.nodes.docgen_qa_node import qa_node, qa_context_node
 from pipeline.nodes.docgen_proofreader_node import proofreader_node
 
 
@@ -17,18 +19,24 @@ def _abort_if_error(state: DocGenState) -> str:
     return "end" if state.error else "continue"
 
 
+def _fan_out_after_scan(state: DocGenState):
+    return END if state.error else ["writer", "qa_context"]
+
+
 def build_docgen_graph():
     g = StateGraph(DocGenState)
 
     g.add_node("scanner",     scanner_node)
     g.add_node("writer",      writer_node)
+    g.add_node("qa_context",  qa_context_node)
     g.add_node("qa",          qa_node)
     g.add_node("proofreader", proofreader_node)
 
     g.set_entry_point("scanner")
 
-    g.add_conditional_edges("scanner",     _abort_if_error, {"continue": "writer",      "end": END})
-    g.add_conditional_edges("writer",      _abort_if_error, {"continue": "qa",          "end": END})
+    # Writer's LLM call overlaps QA's memory retrieval; QA joins on both (and no-ops on writer error)
+    g.add_conditional_edges("scanner",     _fan_out_after_scan, ["writer", "qa_context", END])
+    g.add_edge(["writer", "qa_context"], "qa")
     g.add_conditional_edges("qa",          _abort_if_error, {"continue": "proofreader", "end": END})
     g.add_conditional_edges("proofreader", _abort_if_error, {"continue": END,           "end": END})
 
@@ -41,3 +49,9 @@ _graph = build_docgen_graph()
 def run_docgen_pipeline(state: DocGenState) -> DocGenState:
     result = _graph.invoke(state)
     return DocGenState(**result) if isinstance(result, dict) else result
+
+
+def iter_docgen_pipeline(state: DocGenState) -> Iterator[DocGenState]:
+    """Same run as run_docgen_pipeline, yielding the state after every graph step (the last is the result)."""
+    for values in _graph.stream(state, stream_mode="values"):
+        yield DocGenState(**values) if isinstance(values, dict) else values
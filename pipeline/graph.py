@@ -90,11 +90,18 @@ def _add_conditional(builder: StateGraph, from_node: str, to_node: str) -> None:
 
 
 def _wrap(fn):
-    """Wrap a PipelineState → PipelineState function to work with LangGraph's dict state."""
+    """Wrap a PipelineState → PipelineState function to work with LangGraph's dict state.
+
+    Stage outputs travel through the dict as live model instances (a shallow dump),
+    so they only need validating when something handed us raw dicts.
+    """
     def _node(state: dict) -> dict:
-        ps    = PipelineState(**state)
+        if any(isinstance(v, dict) for v in state.values()):
+            ps = PipelineState(**state)
+        else:
+            ps = PipelineState.model_construct(**state)
         result = fn(ps)
-        return result.model_dump()
+        return dict(result)
     return _node
 
 
@@ -11,14 +11,30 @@ import os
 import subprocess
 import tempfile
 import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import openai
-import re
 
-CLIENT = openai.OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.environ.get("OPENROUTER_API_KEY", ""),
-)
+from models.state import PipelineState, BaselineRun, TestResult
+from utils.fs import iter_py_files
+from utils.llm_utils import extract_code_block
+from utils.retry import openrouter_client, retry_llm
+
+# lib2to3 is deprecated (and gone in 3.13+) — use it when present, else fall back to the LLM
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        from lib2to3.refactor import RefactoringTool
+    _PY2_FIXER = RefactoringTool([
+        "lib2to3.fixes.fix_print",
+        "lib2to3.fixes.fix_except",
+        "lib2to3.fixes.fix_xrange",
+        "lib2to3.fixes.fix_unicode",
+    ])
+except Exception:
+    _PY2_FIXER = None
+
+CLIENT = openrouter_client()
 
 def _call_baseline_fix(filename: str, source: str) -> str:
     """Uses LLM to do bare-minimum syntax fixes for Py3 baseline execution."""
@@ -41,17 +57,26 @@ Instructions:
 5. DO NOT change logic or signatures.
 6. Return the FULL fixed code in a markdown block. No prose."""
     
-    response = CLIENT.chat.completions.create(
+    response = retry_llm(
+        CLIENT.chat.completions.create,
         model=os.environ.get("LLM_MODEL", "google/gemini-2.0-flash-001"),
         messages=[{"role": "user", "content": prompt}]
     )
     text = response.choices[0].message.content
-    code_match = re.search(r"```python\n(.*?)```", text, re.DOTALL)
-    if code_match:
-        return code_match.group(1).strip()
-    return source
+    return extract_code_block(text) or source
 
-from models.state import PipelineState, BaselineRun, TestResult
+
+def _lib2to3_fix(filename: str, source: str) -> str | None:
+    """Deterministic print/except/xrange/unicode fixes via lib2to3; None when it can't parse."""
+    if _PY2_FIXER is None:
+        return None
+    try:
+        if not source.endswith("\n"):
+            source += "\n"
+        return str(_PY2_FIXER.refactor_string(source, filename))
+    except Exception as e:
+        print(f"[baseline] ⚠ lib2to3 could not fix {filename} ({e}), falling back to LLM")
+        return None
 
 
 def baseline_runner_node(state: PipelineState) -> PipelineState:
@@ -187,18 +212,45 @@ def _parse_stdout(output: str, elapsed_ms: float) -> list[TestResult]:
             duration_ms=elapsed_ms,
         ))
     return results
+
+
+# Below this many files, process start-up costs more than the fixing saves
+_POOL_MIN_FILES = 32
+
+
 def _quick_fix_py2_syntax(repo_path: str) -> None:
     """Non-destructive (session-scoped) fix for common Py2 syntax to allow Py3 collection."""
-    from pipeline.nodes.migrator_node import _needs_migration
-    py_files = list(Path(repo_path).rglob("*.py"))
-    for py_file in py_files:
-        if "_bloc_tests" in str(py_file):
-            continue
+    py_files = [str(f) for f in iter_py_files(repo_path)]
+    if not py_files:
+        return
+    # Triage + lib2to3 is CPU-bound and per-file, so large repos fan out to processes.
+    # Workers never touch the LLM: the shared client's connection pool isn't fork-safe.
+    if len(py_files) < _POOL_MIN_FILES:
+        unfixed = [_fix_py2_file(p) for p in py_files]
+    else:
+        with ProcessPoolExecutor(max_workers=min(len(py_files), os.cpu_count() or 1)) as pool:
+            unfixed = list(pool.map(_fix_py2_file, py_files, chunksize=8))
+    for path in filter(None, unfixed):
+        py_file = Path(path)
         try:
-            content = py_file.read_text(encoding="utf-8", errors="replace")
-            if _needs_migration(content):
-                print(f"[baseline] 🔨 Fixing syntax for {py_file.name}...")
-                fixed = _call_baseline_fix(py_file.name, content)
-                py_file.write_text(fixed, encoding="utf-8")
+            fixed = _call_baseline_fix(py_file.name, py_file.read_text(encoding="utf-8", errors="replace"))
+            py_file.write_text(fixed, encoding="utf-8")
         except Exception as e:
             print(f"[baseline] ⚠ Failed to fix {py_file.name}: {e}")
+
+
+def _fix_py2_file(path: str) -> str | None:
+    """lib2to3-fix one file in place. Returns the path when it still needs the LLM fallback."""
+    from pipeline.nodes.migrator_node import _needs_migration
+    py_file = Path(path)
+    try:
+        content = py_file.read_text(encoding="utf-8", errors="replace")
+        if _needs_migration(content):
+            print(f"[baseline] 🔨 Fixing syntax for {py_file.name}...")
+            fixed = _lib2to3_fix(py_file.name, content)
+            if fixed is None:
+                return path
+            py_file.write_text(fixed, encoding="utf-8")
+    except Exception as e:
+        print(f"[baseline] ⚠ Failed to fix {py_file.name}: {e}")
+    return None
@@ -1,6 +1,6 @@
 """
 Node 2b: Dead Code Detector
-Pure Python — ast + networkx.
+Pure Python — ast + a plain adjacency walk.
 Flags unreachable functions, commented-out blocks >5 lines,
 and functions with zero callers in the call graph.
 Runs after workflow_miner so it can reuse the graph.
@@ -12,13 +12,12 @@ import re
 from pathlib import Path
 from typing import Optional
 
-import networkx as nx
-
 from models.state import (
     PipelineState,
     DeadCodeItem,
     DeadCodeReport,
 )
+from utils.fs import iter_py_files
 
 
 def dead_code_node(state: PipelineState) -> PipelineState:
@@ -33,21 +32,24 @@ def dead_code_node(state: PipelineState) -> PipelineState:
                 "current_stage": "dead_code_failed",
             })
 
-        # Rebuild networkx DiGraph from the existing workflow graph
-        G = nx.DiGraph()
-        for n in wg.nodes:
-            G.add_node(n.id)
+        # Adjacency straight from the workflow graph's edges
+        succ: dict[str, list[str]] = {}
+        called: set[str] = set()
         for e in wg.edges:
-            G.add_edge(e.source, e.target)
+            succ.setdefault(e.source, []).append(e.target)
+            called.add(e.target)
+        known = {n.id for n in wg.nodes} | succ.keys() | called
 
         items: list[DeadCodeItem] = []
 
         # 1) Zero-caller functions: nodes with in-degree 0 that are NOT entrypoints
         entrypoint_ids = set(wg.entrypoints)
+        zero_caller_keys: set[tuple[str, str]] = set()
         for n in wg.nodes:
             if n.id in entrypoint_ids:
                 continue
-            if G.in_degree(n.id) == 0:
+            if n.id not in called:
+                zero_caller_keys.add((n.name, n.module))
                 items.append(DeadCodeItem(
                     name=n.name,
                     module=n.module,
@@ -56,17 +58,21 @@ def dead_code_node(state: PipelineState) -> PipelineState:
                     detail=f"Function '{n.name}' has no callers in the call graph",
                 ))
 
-        # 2) Unreachable functions: not reachable from any entrypoint
-        reachable: set[str] = set()
-        for ep in wg.entrypoints:
-            if ep in G:
-                reachable |= nx.descendants(G, ep) | {ep}
+        # 2) Unreachable functions: not reachable from any entrypoint.
+        # One traversal seeded with every entrypoint visits each node and edge
+        # once, instead of a separate descendants() sweep per entrypoint.
+        stack = [ep for ep in wg.entrypoints if ep in known]
+        reachable: set[str] = set(stack)
+        while stack:
+            for nxt in succ.get(stack.pop(), ()):
+                if nxt not in reachable:
+                    reachable.add(nxt)
+                    stack.append(nxt)
 
         for n in wg.nodes:
             if n.id not in reachable and n.id not in entrypoint_ids:
                 # Avoid duplicate if already flagged as zero_callers
-                already = any(i.name == n.name and i.module == n.module and i.kind == "zero_callers" for i in items)
-                if not already:
+                if (n.name, n.module) not in zero_caller_keys:
                     items.append(DeadCodeItem(
                         name=n.name,
                         module=n.module,
@@ -113,7 +119,7 @@ def _find_commented_blocks(
     items: list[DeadCodeItem] = []
     comment_line_re = re.compile(r"^\s*#(?!\s*!)")  # lines starting with # (not shebangs)
 
-    for py_file in Path(repo_path).rglob("*.py"):
+    for py_file in iter_py_files(repo_path):
         if target_module:
             mod = _file_to_module(py_file, repo_path)
             if target_module not in mod:
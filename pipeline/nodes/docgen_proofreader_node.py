@@ -1,12 +1,11 @@
-import os
 import json
-import openai
 from models.docgen_state import DocGenState, ProofreadOutput
+from storage import llm_cache
+from utils.json_utils import parse_json_robust
+from utils.llm_utils import stream_text
+from utils.retry import openrouter_client, retry_llm
 
-client = openai.OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.environ.get("OPENROUTER_API_KEY", ""),
-)
+client = openrouter_client()
 
 def proofreader_node(state: DocGenState) -> DocGenState:
     state.current_stage = "proofreading"
@@ -16,6 +15,9 @@ def proofreader_node(state: DocGenState) -> DocGenState:
         return state
 
     raw_md = state.qa_output.revised_markdown if state.qa_output else state.writer_draft.raw_markdown
+    if not raw_md.strip():
+        state.error = "proofreader_node: nothing to proofread (empty markdown)"
+        return state
 
     prompt = f"""You are a professional technical proofreader. 
 Your task is to take the following documentation draft and perform a final polish.
@@ -41,22 +43,26 @@ Return ONLY valid JSON:
 }}"""
 
     try:
-        response = client.chat.completions.create(
-            model="google/gemini-2.0-flash-001",
-            max_tokens=8192,
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
+        model = "google/gemini-2.0-flash-001"
+
+        def _ask() -> dict:
+            text = retry_llm(
+                stream_text,
+                client,
+                model=model,
+                max_tokens=8192,
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"}
+            )
+            return parse_json_robust(text.strip())
 
-        text = response.choices[0].message.content.strip()
-        from utils.json_utils import parse_json_robust
-        data = parse_json_robust(text)
+        data = llm_cache.get_or_call(llm_cache.cache_key(model, prompt), _ask)
 
         state.proofread_output = ProofreadOutput(
             changes_made=data.get("changes_made", []),
             final_markdown=data.get("final_markdown", raw_md),
             word_count=int(data.get("word_count", len(raw_md.split()))),
-            ready_for_review=bool(data.get("ready_for_review", True))
+            ready_for_review=bool(data.get("ready_for_review", True)),
         )
         state.current_stage = "awaiting_review"
 
@@ -6,17 +6,15 @@ Catches inaccuracies, missing context, and injects business logic the writer mis
 
 from __future__ import annotations
 import json
-import os
-
-import openai
 
 from models.docgen_state import DocGenState, QAIssue, QAOutput
-from storage.memory import RepoMemory
+from storage import llm_cache
+from storage.memory import get_repo_memory
+from utils.json_utils import parse_json_robust
+from utils.llm_utils import stream_text
+from utils.retry import openrouter_client, retry_llm
 
-client = openai.OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.environ.get("OPENROUTER_API_KEY", ""),
-)
+client = openrouter_client()
 
 
 def _build_qa_prompt(state: DocGenState, memory_biz: str = "") -> str:
@@ -24,7 +22,12 @@ def _build_qa_prompt(state: DocGenState, memory_biz: str = "") -> str:
     biz_hints = "\n".join(f"- {h}" for h in state.scanner_output.biz_logic_hints)
     if memory_biz:
         biz_hints += f"\n\n**Additional business logic from memory (previous runs):**\n{memory_biz}"
-    source_snippet = state.source_code[:3000]
+    # Small modules go in verbatim; larger ones as the scanner's outline, which covers
+    # every function instead of whatever fits in the first 3000 chars
+    if len(state.source_code) <= 3000 or not state.source_summary:
+        source_label, source_snippet = "Source code (ground truth)", state.source_code[:3000]
+    else:
+        source_label, source_snippet = "Source outline (signatures + docstrings, ground truth)", state.source_summary[:3000]
 
     return f"""You are a QA engineer and domain expert reviewing technical documentation.
 
@@ -38,7 +41,7 @@ Your job:
 Known business logic hints from code analysis:
 {biz_hints or 'None'}
 
-Source code (ground truth):
+{source_label}:
 ```python
 {source_snippet}
 ```
@@ -64,6 +67,30 @@ Return ONLY valid JSON:
 }}"""
 
 
+def _fetch_memory_biz(state: DocGenState) -> str:
+    """Pull biz logic for this module from repo memory (non-fatal on failure)."""
+    if not state.repo_path or not state.scanner_output:
+        return ""
+    try:
+        mem = get_repo_memory(state.repo_path)
+        results = mem.search_biz_logic(
+            state.scanner_output.module_purpose or "business logic", n=6
+        )
+        if results:
+            print(f"[qa] ✓ Injected {len(results)} biz logic chunks from memory")
+            return "\n".join(f"- {r['text']}" for r in results)
+    except Exception as mem_err:
+        print(f"[qa] ⚠ Memory read failed (non-fatal): {mem_err}")
+    return ""
+
+
+def qa_context_node(state: DocGenState) -> dict:
+    """Runs in parallel with the writer: the memory lookup only needs scanner output."""
+    if state.error:
+        return {}
+    return {"qa_memory_biz": _fetch_memory_biz(state)}
+
+
 def qa_node(state: DocGenState) -> DocGenState:
     state.current_stage = "qa"
 
@@ -74,31 +101,32 @@ def qa_node(state: DocGenState) -> DocGenState:
         state.error = "qa_node: no writer draft"
         return state
 
-    try:
-        # ── Pull biz logic from memory ────────────────────────────────────
-        memory_biz = ""
-        if state.repo_path:
-            try:
-                mem = RepoMemory(state.repo_path)
-                results = mem.search_biz_logic(
-                    state.scanner_output.module_purpose or "business logic", n=6
-                )
-                if results:
-                    memory_biz = "\n".join(f"- {r['text']}" for r in results)
-                    print(f"[qa] ✓ Injected {len(results)} biz logic chunks from memory")
-            except Exception as mem_err:
-                print(f"[qa] ⚠ Memory read failed (non-fatal): {mem_err}")
-
-        response = client.chat.completions.create(
-            model="google/gemini-2.0-flash-001",
-            max_tokens=8192,
-            messages=[{"role": "user", "content": _build_qa_prompt(state, memory_biz)}],
-            response_format={"type": "json_object"}
-        )
+    draft = state.writer_draft.raw_markdown
+    if not draft.strip():
+        state.error = "qa_node: writer draft is empty"
+        return state
 
-        text = response.choices[0].message.content.strip()
-        from utils.json_utils import parse_json_robust
-        data = parse_json_robust(text)
+    try:
+        # ── Pull biz logic from memory (unless prefetched) ────────────────
+        memory_biz = state.qa_memory_biz
+        if memory_biz is None:
+            memory_biz = _fetch_memory_biz(state)
+
+        model  = "google/gemini-2.0-flash-001"
+        prompt = _build_qa_prompt(state, memory_biz)
+
+        def _ask() -> dict:
+            text = retry_llm(
+                stream_text,
+                client,
+                model=model,
+                max_tokens=8192,
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"}
+            )
+            return parse_json_robust(text.strip())
+
+        data = llm_cache.get_or_call(llm_cache.cache_key(model, prompt), _ask)
 
         issues = [QAIssue(**i) for i in data.get("issues_found", [])]
 
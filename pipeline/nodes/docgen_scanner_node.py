@@ -7,23 +7,28 @@ then uses Claude to infer module purpose and spot business logic hints.
 from __future__ import annotations
 import ast
 import json
-import os
 from pathlib import Path
 
-import openai
-
 from models.docgen_state import (
     DocGenState, ExtractedFunction, ExtractedClass, ScannerOutput
 )
-from storage.memory import RepoMemory
+from storage.memory import get_repo_memory
+from utils.retry import openrouter_client, retry_llm
 
-client = openai.OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.environ.get("OPENROUTER_API_KEY", ""),
-)
+client = openrouter_client()
 
 # ─── Pure AST extraction ──────────────────────────────────────────────────────
 
+# Side-effect kind → substrings of an unparsed call that signal it. Checked as a
+# table so a call is tested against each kind once, and unparsing stops as soon
+# as every kind has been seen.
+_SIDE_EFFECT_MARKERS: dict[str, tuple[str, ...]] = {
+    "file_io":  ("open(", "write(", "read("),
+    "env_read": ("os.environ", "getenv"),
+    "network":  ("requests.", "urllib", "http"),
+    "db":       ("cursor.", "execute(", "query("),
+}
+
 def _extract_functions(tree: ast.Module) -> list[dict]:
     funcs = []
     for node in ast.walk(tree):
@@ -50,21 +55,12 @@ def _extract_functions(tree: ast.Module) -> list[dict]:
             # Detect side effects
             side_effects = []
             for child in ast.walk(node):
-                if isinstance(child, ast.Call):
+                if isinstance(child, ast.Call) and len(side_effects) < len(_SIDE_EFFECT_MARKERS):
                     try:
                         call = ast.unparse(child)
-                        if any(s in call for s in ["open(", "write(", "read("]):
-                            if "file_io" not in side_effects:
-                                side_effects.append("file_io")
-                        if any(s in call for s in ["os.environ", "getenv"]):
-                            if "env_read" not in side_effects:
-                                side_effects.append("env_read")
-                        if any(s in call for s in ["requests.", "urllib", "http"]):
-                            if "network" not in side_effects:
-                                side_effects.append("network")
-                        if any(s in call for s in ["cursor.", "execute(", "query("]):
-                            if "db" not in side_effects:
-                                side_effects.append("db")
+                        for kind, markers in _SIDE_EFFECT_MARKERS.items():
+                            if kind not in side_effects and any(m in call for m in markers):
+                                side_effects.append(kind)
                     except Exception:
                         pass
 
@@ -120,6 +116,20 @@ def _extract_classes(tree: ast.Module) -> list[dict]:
     return classes
 
 
+def _summarize_source(functions: list[dict], classes: list[dict]) -> str:
+    """Compact, line-ordered outline (signatures + first docstring line) reused by later prompts."""
+    entries = []
+    for c in classes:
+        bases = f"({', '.join(c['base_classes'])})" if c["base_classes"] else ""
+        doc = (c["docstring"] or "").strip().split("\n")[0]
+        entries.append((c["lineno"], f"class {c['name']}{bases}:" + (f"  # {doc}" if doc else "")))
+    for f in functions:
+        ret = f" -> {f['returns']}" if f["returns"] else ""
+        doc = (f["docstring"] or "").strip().split("\n")[0]
+        entries.append((f["lineno"], f"{f['signature']}{ret}" + (f"  # {doc}" if doc else "")))
+    return "\n".join(line for _, line in sorted(entries, key=lambda e: e[0]))
+
+
 def _get_imports(tree: ast.Module) -> list[str]:
     deps = []
     for node in ast.walk(tree):
@@ -155,7 +165,8 @@ Return ONLY valid JSON with this exact schema:
   "entrypoints": ["list of function names that are the public API / main entry points"]
 }}"""
 
-    response = client.chat.completions.create(
+    response = retry_llm(
+        client.chat.completions.create,
         model="google/gemini-2.0-flash-001",
         max_tokens=1000,
         messages=[{"role": "user", "content": prompt}],
@@ -211,6 +222,8 @@ def scanner_node(state: DocGenState) -> DocGenState:
         raw_classes = _extract_classes(tree)
         deps        = _get_imports(tree)
 
+        state.source_summary = _summarize_source(raw_funcs, raw_classes)
+
         llm_data = _llm_infer(source, raw_funcs, raw_classes)
 
         functions = [ExtractedFunction(**f) for f in raw_funcs]
@@ -229,7 +242,7 @@ def scanner_node(state: DocGenState) -> DocGenState:
         # ── Persist to memory ─────────────────────────────────────────────
         if state.repo_path:
             try:
-                mem = RepoMemory(state.repo_path)
+                mem = get_repo_memory(state.repo_path)
                 changed = mem.record_functions(functions)
                 mem.record_biz_logic(state.scanner_output.biz_logic_hints)
                 if changed:
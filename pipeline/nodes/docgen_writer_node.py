@@ -6,36 +6,61 @@ Covers: module overview, per-function docs, usage examples.
 
 from __future__ import annotations
 import json
-import os
-
-import openai
 
 from models.docgen_state import DocGenState, DocSection, WriterDraft
-from storage.memory import RepoMemory
+from storage.memory import get_repo_memory
+from utils.json_utils import parse_json_robust
+from utils.llm_utils import cached_system_message
+from utils.retry import openrouter_client, retry_llm
 
-client = openai.OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.environ.get("OPENROUTER_API_KEY", ""),
-)
+client = openrouter_client()
+
+# Static instructions live in the system message, ahead of the per-module facts,
+# so the provider can prefix-cache them across every docgen run
+_WRITER_SYSTEM = """You are a senior technical writer creating documentation for a Python module.
+
+Write comprehensive technical documentation in markdown. Include:
+1. A module overview section (2-3 paragraphs)
+2. A "Key Concepts" section explaining the business logic
+3. Per-function documentation with params, returns, example usage, and side effects warnings
+4. A "Quick Start" section with 2-3 realistic usage examples
+5. A "Notes & Gotchas" section for any footguns or important behaviours
+
+Return ONLY valid JSON:
+{
+  "overview": "module overview paragraph",
+  "sections": [
+    {"title": "section title", "content": "markdown content"}
+  ],
+  "usage_examples": ["```python\\n# example 1\\n```", "```python\\n# example 2\\n```"],
+  "raw_markdown": "the complete assembled markdown document"
+}"""
+_SYSTEM_MSG = cached_system_message(_WRITER_SYSTEM)
 
 
 def _build_writer_prompt(state: DocGenState, memory_context: str = "") -> str:
     scanner = state.scanner_output
 
-    func_summaries = []
+    # One flat parts list per section, joined once — no per-function temporaries
+    # from the nested conditional concatenations
+    parts: list[str] = []
     for f in scanner.functions:
-        func_summaries.append(
-            f"- `{f.signature}` → returns `{f.returns or 'None'}`"
-            f"{' [SIDE EFFECTS: ' + ', '.join(f.side_effects) + ']' if f.side_effects else ''}"
-            f"{chr(10) + '  Docstring: ' + f.docstring if f.docstring else ''}"
-        )
-
-    class_summaries = []
+        if parts:
+            parts.append("\n")
+        parts += ("- `", f.signature, "` → returns `", f.returns or "None", "`")
+        if f.side_effects:
+            parts += (" [SIDE EFFECTS: ", ", ".join(f.side_effects), "]")
+        if f.docstring:
+            parts += ("\n  Docstring: ", f.docstring)
+    functions_text = "".join(parts)
+
+    parts = []
     for c in scanner.classes:
-        class_summaries.append(
-            f"- `{c.name}` (bases: {', '.join(c.base_classes) or 'object'}) "
-            f"— methods: {', '.join(c.methods)}"
-        )
+        if parts:
+            parts.append("\n")
+        parts += ("- `", c.name, "` (bases: ", ", ".join(c.base_classes) or "object",
+                  ") — methods: ", ", ".join(c.methods))
+    classes_text = "".join(parts)
 
     biz = "\n".join(f"- {h}" for h in scanner.biz_logic_hints) or "None detected"
 
@@ -43,17 +68,15 @@ def _build_writer_prompt(state: DocGenState, memory_context: str = "") -> str:
     if memory_context:
         memory_section = f"\n\n## Memory context from previous runs\n{memory_context}\n"
 
-    return f"""You are a senior technical writer creating documentation for a Python module.
-
-Module purpose: {scanner.module_purpose}
+    return f"""Module purpose: {scanner.module_purpose}
 Entry points: {', '.join(scanner.entrypoints) or 'unknown'}
 Dependencies: {', '.join(scanner.dependencies[:15])}
 
 Functions:
-{chr(10).join(func_summaries) or 'None'}
+{functions_text or 'None'}
 
 Classes:
-{chr(10).join(class_summaries) or 'None'}
+{classes_text or 'None'}
 
 Business logic hints:
 {biz}
@@ -61,24 +84,7 @@ Business logic hints:
 Source code snippet for context:
 ```python
 {state.source_code[:3000]}
-```
-
-Write comprehensive technical documentation in markdown. Include:
-1. A module overview section (2-3 paragraphs)
-2. A "Key Concepts" section explaining the business logic
-3. Per-function documentation with params, returns, example usage, and side effects warnings
-4. A "Quick Start" section with 2-3 realistic usage examples
-5. A "Notes & Gotchas" section for any footguns or important behaviours
-
-Return ONLY valid JSON:
-{{
-  "overview": "module overview paragraph",
-  "sections": [
-    {{"title": "section title", "content": "markdown content"}}
-  ],
-  "usage_examples": ["```python\\n# example 1\\n```", "```python\\n# example 2\\n```"],
-  "raw_markdown": "the complete assembled markdown document"
-}}"""
+```"""
 
 
 def writer_node(state: DocGenState) -> DocGenState:
@@ -96,7 +102,7 @@ def writer_node(state: DocGenState) -> DocGenState:
         memory_context = ""
         if state.repo_path:
             try:
-                mem = RepoMemory(state.repo_path)
+                mem = get_repo_memory(state.repo_path)
                 memory_context = mem.memory_context_for_writer(
                     state.scanner_output.module_purpose or "Python module"
                 )
@@ -105,15 +111,18 @@ def writer_node(state: DocGenState) -> DocGenState:
             except Exception as mem_err:
                 print(f"[writer] ⚠ Memory read failed (non-fatal): {mem_err}")
 
-        response = client.chat.completions.create(
+        response = retry_llm(
+            client.chat.completions.create,
             model="google/gemini-2.0-flash-001",
             max_tokens=8192,
-            messages=[{"role": "user", "content": _build_writer_prompt(state, memory_context)}],
+            messages=[
+                _SYSTEM_MSG,
+                {"role": "user", "content": _build_writer_prompt(state, memory_context)},
+            ],
             response_format={"type": "json_object"}
         )
 
         text = response.choices[0].message.content.strip()
-        from utils.json_utils import parse_json_robust
         try:
             data = parse_json_robust(text)
         except Exception as e:
@@ -12,6 +12,10 @@ import zipfile
 from pathlib import Path
 
 from models.state import PipelineState
+from utils.fs import iter_py_files
+
+# Non-.py files worth keeping for analysis; everything else (binary assets, etc.) is dropped
+KEEP_EXTENSIONS = {".py", ".txt", ".md", ".cfg", ".toml", ".ini", ".env"}
 
 
 def ingest_node(state: PipelineState) -> PipelineState:
@@ -33,20 +37,20 @@ def ingest_node(state: PipelineState) -> PipelineState:
     workspace = tempfile.mkdtemp(prefix="bloc_")
 
     try:
+        # Only kept files are ever written (keep structure for imports), so nothing needs stripping after
         # Handle zip upload
         if source_path.suffix == ".zip":
             with zipfile.ZipFile(source_path, "r") as zf:
-                zf.extractall(workspace)
+                for info in zf.infolist():
+                    if info.is_dir() or os.path.splitext(info.filename)[1] in KEEP_EXTENSIONS:
+                        zf.extract(info, workspace)
         # Handle directory
         elif source_path.is_dir():
-            shutil.copytree(str(source_path), workspace, dirs_exist_ok=True)
+            shutil.copytree(str(source_path), workspace, dirs_exist_ok=True, ignore=_ignore_unkept)
         else:
             return state.model_copy(update={"error": "Source must be a directory or .zip file", "current_stage": "ingest_failed"})
 
-        # Strip non-.py files (keep structure for imports)
-        _strip_non_python(workspace)
-
-        py_files = list(Path(workspace).rglob("*.py"))
+        py_files = list(iter_py_files(workspace))
         if not py_files:
             return state.model_copy(update={"error": "No Python files found in repo", "current_stage": "ingest_failed"})
 
@@ -61,9 +65,10 @@ def ingest_node(state: PipelineState) -> PipelineState:
         return state.model_copy(update={"error": str(e), "current_stage": "ingest_failed"})
 
 
-def _strip_non_python(workspace: str) -> None:
-    """Remove non-.py files that aren't needed for analysis (binary assets, etc.)"""
-    keep_extensions = {".py", ".txt", ".md", ".cfg", ".toml", ".ini", ".env"}
-    for path in Path(workspace).rglob("*"):
-        if path.is_file() and path.suffix not in keep_extensions:
-            path.unlink()
+def _ignore_unkept(directory: str, names: list[str]) -> list[str]:
+    """copytree ignore hook: skip files (binary assets, etc.) whose extension isn't kept."""
+    return [
+        name for name in names
+        if os.path.splitext(name)[1] not in KEEP_EXTENSIONS
+        and not os.path.isdir(os.path.join(directory, name))
+    ]
@@ -5,18 +5,18 @@ This is the final output judges see.
 """
 
 from __future__ import annotations
-import json
 import os
-
-import openai
+from itertools import islice
 
 from models.state import PipelineState, ConfidenceReport
-from storage.memory import RepoMemory
+from storage import llm_cache
+from storage.memory import get_repo_memory
+from utils.json_utils import parse_json_robust
+from utils.llm_utils import cached_system_message, function_tool, stream_text
+from utils.retry import openrouter_client, retry_llm
 
-CLIENT = openai.OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.environ.get("OPENROUTER_API_KEY", ""),
-)
+CLIENT = openrouter_client()
+MODEL = os.environ.get("LLM_MODEL", "google/gemini-2.0-flash-001")
 
 _SYSTEM = """You are BehaviorLock's report engine.
 Given migration validation results, produce a concise, actionable confidence report for a senior engineer.
@@ -52,6 +52,26 @@ Verdict logic:
 - RISKY: preservation >= 85% OR critical_drifts <= 2
 - BLOCKED: preservation < 85% OR critical_drifts > 2"""
 
+_SYSTEM_MSG = cached_system_message(_SYSTEM)
+
+# Forced function call: the reply arrives as strict JSON arguments, not free text
+_EMIT_REPORT = function_tool(
+    "emit_report",
+    "Return the migration confidence report.",
+    {
+        "type": "object",
+        "properties": {
+            "verdict":          {"type": "string", "enum": ["SAFE", "RISKY", "BLOCKED"]},
+            "what_changed":     {"type": "string"},
+            "why_it_changed":   {"type": "string"},
+            "rollback_command": {"type": "string"},
+            "risk_score":       {"type": "number", "minimum": 0, "maximum": 1},
+            "judge_summary":    {"type": "string"},
+        },
+        "required": ["verdict", "what_changed", "why_it_changed", "rollback_command", "risk_score", "judge_summary"],
+    },
+)
+
 
 def reporter_node(state: PipelineState) -> PipelineState:
     if state.error:
@@ -63,17 +83,17 @@ def reporter_node(state: PipelineState) -> PipelineState:
     vr = state.validation_result
 
     try:
-        drift_details = "\n".join([
+        drift_details = "\n".join(
             f"- [{d.severity.upper()}] {d.test_name}: {d.description}"
             for d in vr.drifts
-        ]) or "No drifts detected."
+        ) or "No drifts detected."
 
         changes_summary = "No changes logged."
         if state.migration_patch and state.migration_patch.changes:
-            lines = []
-            for ch in state.migration_patch.changes[:10]:
-                lines.append(f"- [{ch.change_type}] {ch.file}:{ch.lineno} — {ch.description}")
-            changes_summary = "\n".join(lines)
+            changes_summary = "\n".join(
+                f"- [{ch.change_type}] {ch.file}:{ch.lineno} — {ch.description}"
+                for ch in islice(state.migration_patch.changes, 10)
+            )
 
         passing = sum(1 for r in vr.migrated_results if r.passed)
         total   = len(vr.migrated_results)
@@ -81,17 +101,14 @@ def reporter_node(state: PipelineState) -> PipelineState:
         # ── Pull proactive warnings from memory ───────────────────────────
         warnings_block = ""
         try:
-            mem = RepoMemory(state.repo_path)
-            patch_changes = []
-            if state.migration_patch and state.migration_patch.changes:
-                patch_changes = [c.model_dump() for c in state.migration_patch.changes]
+            mem = get_repo_memory(state.repo_path)
+            patch_changes = state.migration_patch.changes if state.migration_patch else []
             warnings = mem.proactive_warnings(patch_changes)
             if warnings:
-                lines = ["\n## ⚠️ Memory Warnings (patterns seen in previous runs)"]
-                for w in warnings:
-                    badge = "🔴" if w["severity"] == "critical" else "🟡"
-                    lines.append(f"{badge} {w['function']}: {w['message']}")
-                warnings_block = "\n".join(lines)
+                warnings_block = "\n## ⚠️ Memory Warnings (patterns seen in previous runs)\n" + "\n".join(
+                    f"{'🔴' if w['severity'] == 'critical' else '🟡'} {w['function']}: {w['message']}"
+                    for w in warnings
+                )
                 print(f"[reporter] ⚠ {len(warnings)} memory warning(s) injected")
         except Exception as mem_err:
             print(f"[reporter] ⚠ Memory read failed (non-fatal): {mem_err}")
@@ -106,19 +123,22 @@ def reporter_node(state: PipelineState) -> PipelineState:
             changes_summary=changes_summary,
         ) + warnings_block
 
-        response = CLIENT.chat.completions.create(
-            model=os.environ.get("LLM_MODEL", "google/gemini-2.0-flash-001"),
-            max_tokens=1024,
-            messages=[
-                {"role": "system", "content": _SYSTEM},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
+        def _ask() -> dict:
+            raw = retry_llm(
+                stream_text,
+                CLIENT,
+                cache_tag="reporter",
+                model=MODEL,
+                max_tokens=1024,
+                messages=[
+                    _SYSTEM_MSG,
+                    {"role": "user", "content": prompt}
+                ],
+                tool=_EMIT_REPORT,
+            )
+            return parse_json_robust(raw.strip())
 
-        raw = response.choices[0].message.content.strip()
-        from utils.json_utils import parse_json_robust
-        data = parse_json_robust(raw)
+        data = llm_cache.get_or_call(llm_cache.cache_key(MODEL, _SYSTEM, prompt), _ask)
 
         report = ConfidenceReport(
             verdict=data["verdict"],
@@ -136,10 +156,9 @@ def reporter_node(state: PipelineState) -> PipelineState:
 
         # ── Persist run to memory ─────────────────────────────────────────
         try:
-            mem = RepoMemory(state.repo_path)
-            patch_changes = []
-            if state.migration_patch and state.migration_patch.changes:
-                patch_changes = [c.model_dump() for c in state.migration_patch.changes]
+            mem = get_repo_memory(state.repo_path)
+            # PatchChange models go straight through; db serialises them once
+            patch_changes = state.migration_patch.changes if state.migration_patch else []
             mem.record_run(
                 session_id=state.session_id or "unknown",
                 verdict=report.verdict,
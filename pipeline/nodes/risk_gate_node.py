@@ -7,10 +7,11 @@ Blocks high-risk migrations and fires Discord alerts.
 from __future__ import annotations
 import asyncio
 import os
+import threading
 from datetime import datetime, timezone
 
 from models.state import PipelineState, RiskAssessment, RiskWarning
-from storage.memory import RepoMemory
+from storage.memory import get_repo_memory
 from utils.notifications import send_drift_warning
 
 
@@ -33,13 +34,13 @@ def risk_gate_node(state: PipelineState) -> PipelineState:
         })
 
     try:
-        mem = RepoMemory(state.repo_path)
+        mem = get_repo_memory(state.repo_path)
 
         # Build synthetic changes from workflow graph nodes (patch doesn't exist yet)
         synthetic_changes = _build_synthetic_changes(state)
 
-        # Query memory for warnings
-        raw_warnings = mem.proactive_warnings(synthetic_changes)
+        # Query memory for warnings, verdict history and drift history in one pass
+        raw_warnings, past_runs, known_drifts = mem.snapshot(synthetic_changes, limit=10)
         warnings = [
             RiskWarning(
                 source=w.get("source", "memory"),
@@ -51,16 +52,17 @@ def risk_gate_node(state: PipelineState) -> PipelineState:
             for w in raw_warnings
         ]
 
-        # Query past runs for verdict history
-        past_runs = mem.past_runs(limit=10)
-        known_drifts = mem.known_drifts()
+        # Side-effect density and test coverage gap feed both the score and the assessment
+        side_effect_density = _side_effect_density(state)
+        test_coverage_gap = _test_coverage_gap(state)
 
         # Compute risk score
         risk_score = _compute_risk_score(
             warnings=warnings,
             past_runs=past_runs,
             known_drifts=known_drifts,
-            state=state,
+            se_density=side_effect_density,
+            cov_gap=test_coverage_gap,
         )
 
         # Determine risk level
@@ -69,12 +71,6 @@ def risk_gate_node(state: PipelineState) -> PipelineState:
         # Worst historical verdict
         worst_verdict = _worst_verdict(past_runs)
 
-        # Side-effect density
-        side_effect_density = _side_effect_density(state)
-
-        # Test coverage gap
-        test_coverage_gap = _test_coverage_gap(state)
-
         assessment = RiskAssessment(
             risk_score=round(risk_score, 4),
             risk_level=risk_level,
@@ -93,41 +89,26 @@ def risk_gate_node(state: PipelineState) -> PipelineState:
             f"drift_history={len(known_drifts)} past_runs={len(past_runs)}"
         )
 
-        # Fire Discord alert if score > 0.5
+        # Fire Discord alert if score > 0.5 — on a daemon thread with its own loop,
+        # so the node never waits on the webhook round-trip
         if risk_score > 0.5:
             dashboard_url = os.environ.get("BASE_URL", "http://localhost:8000")
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    asyncio.ensure_future(send_drift_warning(
-                        repo_path=state.repo_path,
-                        session_id=state.session_id,
-                        risk_score=risk_score,
-                        warnings=warnings,
-                        dashboard_url=dashboard_url,
-                    ))
-                else:
-                    loop.run_until_complete(send_drift_warning(
-                        repo_path=state.repo_path,
-                        session_id=state.session_id,
-                        risk_score=risk_score,
-                        warnings=warnings,
-                        dashboard_url=dashboard_url,
-                    ))
-            except Exception as e:
-                print(f"[risk_gate] Discord notification failed (non-fatal): {e}")
+            threading.Thread(
+                target=_send_alert,
+                kwargs={
+                    "repo_path": state.repo_path,
+                    "session_id": state.session_id,
+                    "risk_score": risk_score,
+                    "warnings": warnings,
+                    "dashboard_url": dashboard_url,
+                },
+                daemon=True,
+            ).start()
 
         # Decide whether to block
-        threshold = _threshold()
-        if risk_score >= threshold:
-            return state.model_copy(update={
-                "risk_assessment": assessment,
-                "current_stage": "risk_blocked",
-            })
-
         return state.model_copy(update={
             "risk_assessment": assessment,
-            "current_stage": "risk_analyzed",
+            "current_stage": "risk_blocked" if risk_score >= _threshold() else "risk_analyzed",
         })
 
     except Exception as e:
@@ -137,13 +118,21 @@ def risk_gate_node(state: PipelineState) -> PipelineState:
         })
 
 
+def _send_alert(**kwargs) -> None:
+    try:
+        asyncio.run(send_drift_warning(**kwargs))
+    except Exception as e:
+        print(f"[risk_gate] Discord notification failed (non-fatal): {e}")
+
+
 # ─── Risk score algorithm ────────────────────────────────────────────────────
 
 def _compute_risk_score(
     warnings: list[RiskWarning],
     past_runs: list[dict],
     known_drifts: list[dict],
-    state: PipelineState,
+    se_density: float,
+    cov_gap: float,
 ) -> float:
     """
     Max 1.0, four weighted factors:
@@ -153,22 +142,30 @@ def _compute_risk_score(
     - Test coverage gap     (max 0.20): (1 - coverage_pct/100) * 0.2
     """
 
-    # Factor 1: Known drift severity (max 0.35)
-    critical_count = sum(1 for w in warnings if w.severity == "critical")
-    non_critical_count = sum(1 for w in warnings if w.severity == "non_critical")
+    # Factor 1: Known drift severity (max 0.35) — severities are already
+    # normalised to critical/non_critical, so one pass counts both
+    critical_count = non_critical_count = 0
+    for w in warnings:
+        if w.severity == "critical":
+            critical_count += 1
+        else:
+            non_critical_count += 1
     drift_factor = min(critical_count * 0.15 + non_critical_count * 0.05, 0.35)
 
     # Factor 2: Past verdict history (max 0.25)
-    blocked_count = sum(1 for r in past_runs if r.get("verdict") == "BLOCKED")
-    risky_count = sum(1 for r in past_runs if r.get("verdict") == "RISKY")
+    blocked_count = risky_count = 0
+    for r in past_runs:
+        v = r.get("verdict")
+        if v == "BLOCKED":
+            blocked_count += 1
+        elif v == "RISKY":
+            risky_count += 1
     verdict_factor = min(blocked_count * 0.10 + risky_count * 0.05, 0.25)
 
     # Factor 3: Side-effect density (max 0.20)
-    se_density = _side_effect_density(state)
     se_factor = min(se_density * 0.4, 0.20)
 
     # Factor 4: Test coverage gap (max 0.20)
-    cov_gap = _test_coverage_gap(state)
     cov_factor = min(cov_gap * 0.2, 0.20)
 
     total = drift_factor + verdict_factor + se_factor + cov_factor
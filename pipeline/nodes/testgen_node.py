@@ -5,20 +5,29 @@ and structured JSON output for test code.
 """
 
 from __future__ import annotations
+import ast
+import asyncio
 import hashlib
 import json
 import os
 import re
+from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
 
 import openai
 
 from models.state import PipelineState, GeneratedTest, TestSuite
+from storage import llm_cache
+from utils.async_utils import run_coro_sync
+from utils.json_utils import parse_json_robust
+from utils.llm_utils import astream_text, cached_system_message, function_tool
+from utils.retry import aretry_llm, openrouter_async_client
+
+
+def _concurrency() -> int:
+    return max(1, int(os.environ.get("BLOC_TESTGEN_CONCURRENCY", "8")))
 
-CLIENT = openai.OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.environ.get("OPENROUTER_API_KEY", ""),
-)
 
 TESTGEN_SYSTEM = """You are an expert Python test engineer specialising in characterization tests.
 
@@ -39,28 +48,48 @@ Rules:
 - Hardcode the expected "golden" strings/values directly in the test assertions
 - DO NOT use a "snapshot" or "mocker" fixture"""
 
-TESTGEN_USER = """Generate a characterization test for this Python function.
+# Static instructions first, per-function material last, so calls share the longest
+# possible prompt prefix for provider-side caching
+TESTGEN_USER = """Generate a characterization test for the Python function below.
 
-## Function source:
-```python
-{function_source}
-```
+Respond with a JSON object:
+{{
+  "test_code": "<full pytest file as a string>",
+  "snapshot_inputs": ["<human-readable description of each fixture input>"],
+  "covers_side_effects": true/false
+}}
 
-## Call graph context (what this function calls):
-{call_context}
+## Module path:
+{module_path}
 
 ## Side effects detected:
 {side_effects}
 
-## Module path:
-{module_path}
+## Call graph context (what this function calls):
+{call_context}
 
-Respond with a JSON object:
-{{
-  "test_code": "<full pytest file as a string>",
-  "snapshot_inputs": ["<human-readable description of each fixture input>"],
-  "covers_side_effects": true/false
-}}"""
+## Function source:
+```python
+{function_source}
+```"""
+
+# Forced function call: the reply arrives as strict JSON arguments, not free text
+_EMIT_TEST = function_tool(
+    "emit_test",
+    "Return the generated characterization test.",
+    {
+        "type": "object",
+        "properties": {
+            "test_code":           {"type": "string"},
+            "snapshot_inputs":     {"type": "array", "items": {"type": "string"}},
+            "covers_side_effects": {"type": "boolean"},
+        },
+        "required": ["test_code", "snapshot_inputs", "covers_side_effects"],
+    },
+)
+
+# Read-only, so the concurrent testgen calls can all share it
+_SYSTEM_MSG = cached_system_message(TESTGEN_SYSTEM)
 
 
 def testgen_node(state: PipelineState) -> PipelineState:
@@ -86,19 +115,34 @@ def testgen_node(state: PipelineState) -> PipelineState:
         generated: list[GeneratedTest] = []
         edge_map = _build_edge_map(wf_graph)
 
+        # Source extraction is local and cheap; only the LLM calls fan out
+        # Group by module so each module's files are resolved and parsed once
+        names_by_module: dict[str, list[str]] = defaultdict(list)
+        for node in target_nodes:
+            names_by_module[node.module].append(node.name)
+        sources = {
+            module: _extract_module_sources(repo_path, module, names)
+            for module, names in names_by_module.items()
+        }
+
+        jobs: list[tuple[object, dict]] = []
         for node in target_nodes:
-            fn_source = _extract_function_source(repo_path, node.module, node.name)
+            fn_source = sources[node.module].get(node.name)
             if not fn_source:
                 continue
-
-            call_context = _build_call_context(node, edge_map, wf_graph)
-            result = _call_claude_testgen(
-                function_source=fn_source,
-                call_context=call_context,
-                side_effects=node.side_effects,
-                module_path=node.module,
-            )
-
+            jobs.append((node, {
+                "function_source": fn_source,
+                "call_context":    _build_call_context(node, edge_map, wf_graph),
+                "side_effects":    node.side_effects,
+                "module_path":     node.module,
+            }))
+
+        results = run_coro_sync(_generate_all([kwargs for _, kwargs in jobs])) if jobs else []
+
+        for (node, _), result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                print(f"[testgen] ⚠ Generation failed for {node.id}: {result}")
+                continue
             if result:
                 generated.append(GeneratedTest(
                     function_name=node.id,
@@ -139,7 +183,8 @@ def testgen_node(state: PipelineState) -> PipelineState:
 
 # ─── Claude API call (now Gemini via OpenRouter) ──────────────────────────────
 
-def _call_claude_testgen(
+async def _call_claude_testgen(
+    client: openai.AsyncOpenAI,
     function_source: str,
     call_context: str,
     side_effects: list[str],
@@ -152,71 +197,138 @@ def _call_claude_testgen(
         module_path=module_path,
     )
 
-    response = CLIENT.chat.completions.create(
-        model="google/gemini-2.0-flash-001",
-        max_tokens=4096,
-        messages=[
-            {"role": "system", "content": TESTGEN_SYSTEM},
-            {"role": "user", "content": prompt}
-        ],
-        response_format={"type": "json_object"}
+    model    = "google/gemini-2.0-flash-001"
+    salvaged = False
+
+    async def _ask() -> dict:
+        nonlocal salvaged
+        raw = await aretry_llm(
+            astream_text,
+            client,
+            cache_tag="testgen",
+            model=model,
+            max_tokens=4096,
+            messages=[
+                _SYSTEM_MSG,
+                {"role": "user", "content": prompt}
+            ],
+            tool=_EMIT_TEST,
+        )
+        if os.environ.get("BLOC_DEBUG"):
+            print(f"[testgen] RAW LLM OUTPUT (len={len(raw)}):\n---START---\n{raw}\n---END---")
+        raw = raw.strip()
+
+        try:
+            return parse_json_robust(raw)
+        except Exception as e:
+            print(f"[testgen] ❌ JSON Error: {e}")
+            # Attempt to salvage — wrap in minimal structure
+            salvaged = True
+            return {"test_code": raw, "snapshot_inputs": [], "covers_side_effects": False}
+
+    # Salvaged replies are used this run but never cached, so the next run asks again
+    return await llm_cache.aget_or_call(
+        llm_cache.cache_key(model, TESTGEN_SYSTEM, prompt), _ask,
+        should_cache=lambda _: not salvaged,
     )
 
-    raw = response.choices[0].message.content
-    print(f"[testgen] FINISH REASON: {response.choices[0].finish_reason}")
-    print(f"[testgen] RAW LLM OUTPUT (len={len(raw)}):\n---START---\n{raw}\n---END---")
-    raw = raw.strip()
+async def _generate_all(jobs: list[dict]) -> list[dict | None | BaseException]:
+    """Run every testgen prompt concurrently over one client; results keep job order."""
+    sem = asyncio.Semaphore(_concurrency())
+    async with openrouter_async_client() as client:
+        async def _one(kwargs: dict) -> dict | None:
+            async with sem:
+                return await _call_claude_testgen(client, **kwargs)
 
-    from utils.json_utils import parse_json_robust
-    try:
-        return parse_json_robust(raw)
-    except Exception as e:
-        print(f"[testgen] ❌ JSON Error: {e}")
-        # Attempt to salvage — wrap in minimal structure
-        return {"test_code": raw, "snapshot_inputs": [], "covers_side_effects": False}
+        return await asyncio.gather(*(_one(kwargs) for kwargs in jobs), return_exceptions=True)
 
 
 # ─── Helpers ──────────────────────────────────────────────────────────────────
 
-def _extract_function_source(repo_path: str, module: str, fn_name: str) -> str | None:
-    """Find the source code of a specific function in the repo."""
-    import ast as _ast
-
-    # Convert module path to file path
-    mod_parts  = module.split(".")
-    candidates = [
+@lru_cache(maxsize=256)
+def _module_files(repo_path: str, module: str) -> tuple[Path, ...]:
+    """Existing files a dotted module path can live in (mod.py, then mod/__init__.py)."""
+    mod_parts = module.split(".")
+    candidates = (
         Path(repo_path) / Path(*mod_parts).with_suffix(".py"),
         Path(repo_path) / Path(*mod_parts) / "__init__.py",
-    ]
-
-    for candidate in candidates:
-        if not candidate.exists():
-            continue
+    )
+    return tuple(c for c in candidates if c.exists())
+
+
+@lru_cache(maxsize=256)
+def _parse_module(path: str, mtime_ns: int) -> tuple[dict[str, tuple[int, int]] | None, tuple[str, ...]]:
+    """
+    Parse a file once per (path, mtime): returns fn_name -> (start, end) line span
+    and the source lines. Module-level functions are indexed first, then class
+    methods, then nested defs (the miner emits those as nodes too), so a nested
+    helper never shadows a top-level target of the same name. The index is None when the file doesn't parse (legacy Python 2), so callers
+    fall back to regex.
+    """
+    source = Path(path).read_text(encoding="utf-8", errors="replace")
+    lines = tuple(source.splitlines())
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None, lines
+    index: dict[str, tuple[int, int]] = {}
+    fn_types = (ast.FunctionDef, ast.AsyncFunctionDef)
+    methods = []
+    for node in tree.body:
+        if isinstance(node, fn_types):
+            index.setdefault(node.name, (node.lineno, node.end_lineno or (node.lineno + 20)))
+        elif isinstance(node, ast.ClassDef):
+            methods.extend(n for n in node.body if isinstance(n, fn_types))
+    for node in methods:
+        index.setdefault(node.name, (node.lineno, node.end_lineno or (node.lineno + 20)))
+    for node in ast.walk(tree):
+        if isinstance(node, fn_types):
+            index.setdefault(node.name, (node.lineno, node.end_lineno or (node.lineno + 20)))
+    return index, lines
+
+
+def _def_pattern(fn_names: tuple[str, ...]) -> re.Pattern:
+    """One alternation over every name still missing, so a file's lines are scanned once."""
+    return re.compile(rf"^\s*def\s+({'|'.join(map(re.escape, fn_names))})\s*\(")
+
+
+def _block_from(lines: tuple[str, ...], start: int) -> str:
+    # Find end by looking for next non-indented def or class or end of file
+    for j in range(start + 1, len(lines)):
+        if lines[j].strip() and not lines[j].startswith(" "):
+            return "\n".join(lines[start:j])
+    return "\n".join(lines[start:])
+
+
+def _extract_module_sources(repo_path: str, module: str, fn_names: list[str]) -> dict[str, str]:
+    """
+    Find the source of every requested function in one module, stat-ing and
+    parsing each candidate file once however many targets share it.
+    """
+    wanted = set(fn_names)
+    found: dict[str, str] = {}
+    for candidate in _module_files(repo_path, module):
         try:
-            source = candidate.read_text(encoding="utf-8", errors="replace")
-            try:
-                tree = _ast.parse(source)
-                for node in _ast.walk(tree):
-                    if isinstance(node, (_ast.FunctionDef, _ast.AsyncFunctionDef)):
-                        if node.name == fn_name:
-                            lines = source.splitlines()
-                            end   = node.end_lineno or (node.lineno + 20)
-                            return "\n".join(lines[node.lineno - 1: end])
-            except SyntaxError:
-                # Regex fallback for legacy Python 2
-                lines = source.splitlines()
-                pattern = re.compile(rf"^\s*def\s+{fn_name}\s*\(")
-                for i, line in enumerate(lines):
-                    if pattern.match(line):
-                        # Find end by looking for next non-indented def or class or end of file
-                        start = i
-                        for j in range(i + 1, len(lines)):
-                            if lines[j].strip() and not lines[j].startswith(" "):
-                                return "\n".join(lines[start:j])
-                        return "\n".join(lines[start:])
+            index, lines = _parse_module(str(candidate), candidate.stat().st_mtime_ns)
         except Exception:
             continue
-    return None
+        if index is not None:
+            for fn_name in wanted - found.keys():
+                span = index.get(fn_name)
+                if span:
+                    found[fn_name] = "\n".join(lines[span[0] - 1: span[1]])
+        elif missing := wanted - found.keys():
+            # Regex fallback only for files ast can't parse (legacy Python 2)
+            pattern = _def_pattern(tuple(sorted(missing)))
+            for i, line in enumerate(lines):
+                m = pattern.match(line)
+                if m and m.group(1) not in found:
+                    found[m.group(1)] = _block_from(lines, i)
+                    if len(found) == len(wanted):
+                        break
+        if len(found) == len(wanted):
+            break
+    return found
 
 
 def _build_edge_map(wf_graph) -> dict[str, list[str]]:
@@ -16,7 +16,8 @@ from models.state import (
     PipelineState, ValidationResult, TestResult, DriftItem
 )
 from pipeline.nodes.baseline_runner_node import _run_pytest
-from storage.memory import RepoMemory
+from storage.memory import get_repo_memory
+from utils.fs import write_files
 
 
 def validator_node(state: PipelineState) -> PipelineState:
@@ -42,53 +43,57 @@ def validator_node(state: PipelineState) -> PipelineState:
         test_dir.mkdir(exist_ok=True)
         (test_dir / "__init__.py").touch()
 
-        for i, test in enumerate(test_suite.tests):
-            safe_name = test.function_name.replace(".", "_")
-            test_file = test_dir / f"test_{safe_name}_{i}.py"
-            test_file.write_text(test.test_code, encoding="utf-8")
+        write_files(
+            (test_dir / f"test_{test.function_name.replace('.', '_')}_{i}.py", test.test_code)
+            for i, test in enumerate(test_suite.tests)
+        )
 
         migrated_results = _run_pytest(migrated_path, test_dir)
 
-        # Diff against baseline
-        baseline_map  = {r.test_name: r for r in baseline.results}
-        migrated_map  = {r.test_name: r for r in migrated_results}
+        # Diff against baseline. Only tests that passed on legacy code can drift, so index
+        # just those, with their outputs stripped once up front.
+        baseline_map    = {r.test_name: r for r in baseline.results}
+        baseline_passed = {name: r.output.strip() for name, r in baseline_map.items() if r.passed}
+        migrated_map    = {r.test_name: r for r in migrated_results}
 
         drifts: list[DriftItem] = []
+        critical_count = 0
 
         for test_name, migrated_result in migrated_map.items():
-            baseline_result = baseline_map.get(test_name)
+            before_out = baseline_passed.get(test_name)
 
-            if baseline_result is None:
+            if before_out is None:
                 continue
+            migrated_passed = migrated_result.passed
+            migrated_out    = migrated_result.output
 
             # A drift is: baseline passed but migrated failed, OR output changed
-            is_failure_drift = baseline_result.passed and not migrated_result.passed
+            is_failure_drift = not migrated_passed
             is_output_drift  = (
-                baseline_result.passed
-                and migrated_result.passed
-                and baseline_result.output.strip() != migrated_result.output.strip()
-                and baseline_result.output.strip() != ""
+                migrated_passed
+                and before_out != ""
+                and before_out != migrated_out.strip()
             )
 
             if is_failure_drift or is_output_drift:
-                severity = "critical" if is_failure_drift else "non_critical"
+                baseline_result = baseline_map[test_name]
+                critical_count += is_failure_drift
                 drifts.append(DriftItem(
                     test_name=test_name,
-                    severity=severity,
+                    severity="critical" if is_failure_drift else "non_critical",
                     description=_describe_drift(
                         is_failure_drift, is_output_drift,
                         baseline_result, migrated_result
                     ),
                     before_output=baseline_result.output[:300],
-                    after_output=migrated_result.output[:300],
+                    after_output=migrated_out[:300],
                 ))
 
         total = len(migrated_results)
         drifting = len(drifts)
         preservation_pct = ((total - drifting) / total * 100) if total > 0 else 0.0
 
-        critical_count     = sum(1 for d in drifts if d.severity == "critical")
-        non_critical_count = sum(1 for d in drifts if d.severity == "non_critical")
+        non_critical_count = drifting - critical_count
 
         result = ValidationResult(
             migrated_results=migrated_results,
@@ -105,20 +110,20 @@ def validator_node(state: PipelineState) -> PipelineState:
             f"{preservation_pct:.1f}% preserved"
         )
 
-        # ── Persist drifts to memory ──────────────────────────────────────
-        try:
-            mem = RepoMemory(state.repo_path)
-            for d in drifts:
-                mem.record_drift(
-                    function_name=d.test_name,
-                    severity=d.severity,
-                    description=d.description,
-                    before_output=d.before_output or "",
-                    after_output=d.after_output or "",
-                )
-            print(f"[validator] ✓ Persisted {len(drifts)} drift(s) to memory")
-        except Exception as mem_err:
-            print(f"[validator] ⚠ Memory write failed (non-fatal): {mem_err}")
+        # ── Persist drifts to memory (clean runs have nothing to write) ───
+        if drifts:
+            try:
+                mem = get_repo_memory(state.repo_path)
+                mem.record_drifts([{
+                    "function_name": d.test_name,
+                    "severity":      d.severity,
+                    "description":   d.description,
+                    "before_output": d.before_output,
+                    "after_output":  d.after_output,
+                } for d in drifts])
+                print(f"[validator] ✓ Persisted {len(drifts)} drift(s) to memory")
+            except Exception as mem_err:
+                print(f"[validator] ⚠ Memory write failed (non-fatal): {mem_err}")
 
         return state.model_copy(update={
             "validation_result": result,
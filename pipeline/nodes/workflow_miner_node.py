@@ -1,6 +1,6 @@
 """
 Node 2: Workflow Miner
-Pure Python — ast + networkx.
+Pure Python — ast + plain dict adjacency.
 Extracts: entry points, call chains, side effects, hidden dependencies.
 No LLM needed.
 """
@@ -9,12 +9,13 @@ from __future__ import annotations
 import ast
 import re
 import os
-from pathlib import Path
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional, Any
 
-import networkx as nx
-
 from models.state import PipelineState, WorkflowGraph, CallNode, CallEdge
+from utils.fs import iter_py_files, read_bytes
 
 
 # Side effect patterns to detect
@@ -26,6 +27,27 @@ SIDE_EFFECT_PATTERNS = {
     "subprocess":{"subprocess.run", "subprocess.call", "os.system", "Popen"},
 }
 
+# One alternation per effect type, plus a combined one that rejects the common
+# no-side-effect case in a single scan instead of ~25 substring checks
+_SIDE_EFFECT_RES = [
+    (effect_type, re.compile("|".join(map(re.escape, patterns))))
+    for effect_type, patterns in SIDE_EFFECT_PATTERNS.items()
+]
+_ANY_SIDE_EFFECT_RE = re.compile("|".join(rx.pattern for _, rx in _SIDE_EFFECT_RES))
+
+
+# Regex fallback: 'def func_name(args):' and 'self.method(' / 'func(' call sites
+_DEF_RE     = re.compile(r"^\s*def\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\(")
+_CALL_RE    = re.compile(r"([a-zA-Z_][a-zA-Z0-9_\.]*)\s*\(")
+_NOT_CALLS  = {"def", "if", "for", "while", "print"}
+
+
+def _side_effects_in(text: str) -> list[str]:
+    """Effect types whose patterns occur anywhere in text (substring semantics)."""
+    if not _ANY_SIDE_EFFECT_RE.search(text):
+        return []
+    return [effect_type for effect_type, rx in _SIDE_EFFECT_RES if rx.search(text)]
+
 ENTRYPOINT_NAMES = {
     "main", "__main__", "run", "start", "execute", "handle", "process",
     "app", "application", "cli", "entry",
@@ -67,108 +89,137 @@ def workflow_miner_node(state: PipelineState) -> PipelineState:
 
 # ─── AST visitor ──────────────────────────────────────────────────────────────
 
-class _CallVisitor(ast.NodeVisitor):
-    def __init__(self, module_name: str):
-        self.module_name = module_name
-        self.functions: dict[str, dict] = {}   # name -> {lineno, calls, side_effects}
-        self._current_fn: Optional[str] = None
-
-    def visit_FunctionDef(self, node: ast.FunctionDef):
-        qname = f"{self.module_name}.{node.name}"
-        self.functions[qname] = {
-            "lineno":      node.lineno,
-            "calls":       [],
-            "side_effects": [],
-        }
-        prev = self._current_fn
-        self._current_fn = qname
-        self.generic_visit(node)
-        self._current_fn = prev
-
-    visit_AsyncFunctionDef = visit_FunctionDef
-
-    def visit_Call(self, node: ast.Call):
-        if not self._current_fn:
-            self.generic_visit(node)
-            return
-
-        call_name = _extract_call_name(node)
-        if call_name:
-            self.functions[self._current_fn]["calls"].append(call_name)
-
-            # Check for side effects
-            for effect_type, patterns in SIDE_EFFECT_PATTERNS.items():
-                if any(p in call_name for p in patterns):
-                    self.functions[self._current_fn]["side_effects"].append(effect_type)
-
-        self.generic_visit(node)
-
-    def visit_Attribute(self, node: ast.Attribute):
-        # Catch os.environ access (attribute, not a call)
-        if isinstance(node.value, ast.Name) and node.value.id == "os":
-            if node.attr in {"environ"}:
-                if self._current_fn:
-                    self.functions[self._current_fn]["side_effects"].append("env_read")
-        self.generic_visit(node)
+def _extract_functions(tree: ast.AST, module_name: str) -> dict[str, dict]:
+    """
+    name -> {lineno, calls, side_effects} for every function in tree.
+    Iterative pre-order walk with an explicit (node, enclosing fn) stack: same
+    visit order as a recursive NodeVisitor, without per-node method dispatch or
+    recursion-depth limits on deeply nested legacy files.
+    """
+    functions: dict[str, dict] = {}
+    fn_types = (ast.FunctionDef, ast.AsyncFunctionDef)
+    stack: list[tuple[ast.AST, Optional[str]]] = [(tree, None)]
+    while stack:
+        node, current_fn = stack.pop()
+        cls = type(node)
+
+        if cls in fn_types:
+            current_fn = f"{module_name}.{node.name}"
+            functions[current_fn] = {
+                "lineno":      node.lineno,
+                "calls":       [],
+                "side_effects": set(),
+            }
+        elif current_fn is not None:
+            if cls is ast.Call:
+                call_name = _extract_call_name(node)
+                if call_name:
+                    functions[current_fn]["calls"].append(call_name)
+                    # Check for side effects
+                    functions[current_fn]["side_effects"].update(_side_effects_in(call_name))
+            elif cls is ast.Attribute:
+                # Catch os.environ access (attribute, not a call)
+                value = node.value
+                if type(value) is ast.Name and value.id == "os" and node.attr == "environ":
+                    functions[current_fn]["side_effects"].add("env_read")
+
+        # Push children reversed so they pop in source order
+        children = list(ast.iter_child_nodes(node))
+        for child in reversed(children):
+            stack.append((child, current_fn))
+    return functions
 
 
 def _extract_call_name(node: ast.Call) -> Optional[str]:
     if isinstance(node.func, ast.Name):
         return node.func.id
     if isinstance(node.func, ast.Attribute):
-        parts = []
+        # Walk a.b.c right-to-left, prepending, so no reversal pass is needed
+        parts: deque[str] = deque()
         curr = node.func
         while isinstance(curr, ast.Attribute):
-            parts.append(curr.attr)
+            parts.appendleft(curr.attr)
             curr = curr.value
         if isinstance(curr, ast.Name):
-            parts.append(curr.id)
-        return ".".join(reversed(parts))
+            parts.appendleft(curr.id)
+        return ".".join(parts)
     return None
 
 
+# ─── Per-file parsing ─────────────────────────────────────────────────────────
+
+# Below this many files, worker start-up costs more than the parsing it would parallelise
+_POOL_MIN_FILES = 32
+
+
+def _parse_one(path: str, mod_name: str) -> dict[str, dict]:
+    """Worker: parse and visit one file, falling back to regex for legacy/broken source."""
+    data = read_bytes(path)
+    # Both extractors only record defs, so a file without the keyword (package
+    # __init__s, constants, config) can't contribute — skip the decode and parse
+    if b"def" not in data:
+        return {}
+    source = data.decode("utf-8", "replace")
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        # Python 2 syntax (no reparse can rescue it), null bytes, or nesting too deep for the parser
+        return _regex_extract_functions(source, mod_name)
+
+    try:
+        return _extract_functions(tree, mod_name)
+    except Exception:
+        # Fallback to regex-based extraction for broken/legacy files
+        return _regex_extract_functions(source, mod_name)
+
+
+def _parse_all(paths: list[str], mod_names: list[str]) -> list[dict[str, dict]]:
+    """ast.parse + visit is CPU-bound and per-file independent, so big trees fan out over processes."""
+    if len(paths) < _POOL_MIN_FILES:
+        return [_parse_one(p, m) for p, m in zip(paths, mod_names)]
+    with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as pool:
+        return list(pool.map(_parse_one, paths, mod_names, chunksize=8))
+
+
 # ─── Graph construction ───────────────────────────────────────────────────────
 
 def _build_call_graph(
     repo_path: str,
     target_module: Optional[str],
-) -> tuple[nx.DiGraph, list[CallNode], list[CallEdge]]:
+) -> tuple[dict[str, dict[str, None]], list[CallNode], list[CallEdge]]:
+    """
+    Returns (succ, nodes, edges). succ maps caller id -> callee ids as an
+    insertion-ordered dict-as-set, so traversal order is deterministic.
+    """
 
-    G = nx.DiGraph()
+    succ: dict[str, dict[str, None]] = {}
     all_functions: dict[str, dict] = {}
 
-    py_files = list(Path(repo_path).rglob("*.py"))
+    py_files = map(str, iter_py_files(repo_path))
 
-    for py_file in py_files:
-        mod_name = _file_to_module(py_file, repo_path)
+    # Normalize target_module to dot-notation if it's a path
+    normalized_target = (
+        target_module.replace(".py", "").replace("/", ".").replace("\\", ".")
+        if target_module else None
+    )
 
-        # Normalize target_module to dot-notation if it's a path
-        if target_module:
-            normalized_target = target_module.replace(".py", "").replace("/", ".").replace("\\", ".")
-            # If target_module is a specific file, we only care about that or its submodules
-            if normalized_target not in mod_name and mod_name not in normalized_target:
-                continue
+    root_prefix = os.path.join(repo_path, "")
+    paths: list[str] = []
+    mod_names: list[str] = []
+    for py_file in py_files:
+        mod_name = _file_to_module(py_file, root_prefix)
+        # If target_module is a specific file, we only care about that or its submodules
+        if normalized_target and normalized_target not in mod_name and mod_name not in normalized_target:
+            continue
+        paths.append(py_file)
+        mod_names.append(mod_name)
 
-        source = py_file.read_text(encoding="utf-8", errors="replace")
-        try:
-            tree = ast.parse(source)
-        except (SyntaxError, ValueError):
-            # Python 2 syntax or Python 3.13+ removing feature_version=(2,7)
-            tree = None
-
-        visitor = _CallVisitor(mod_name)
-        if tree:
-            try:
-                visitor.visit(tree)
-                all_functions.update(visitor.functions)
-            except Exception:
-                # Fallback to regex-based extraction for broken/legacy files
-                regex_funcs = _regex_extract_functions(source, mod_name)
-                all_functions.update(regex_funcs)
-        else:
-            # Fallback to regex-based extraction for broken/legacy files
-            regex_funcs = _regex_extract_functions(source, mod_name)
-            all_functions.update(regex_funcs)
+    # Intern ids and callee names on merge (pool workers' strings arrive unpickled
+    # as fresh copies): the same names recur across nodes, edges and lookups
+    for functions in _parse_all(paths, mod_names):
+        for qname, info in functions.items():
+            info["calls"] = [sys.intern(c) for c in info["calls"]]
+            all_functions[sys.intern(qname)] = info
 
     # Build nodes
     call_nodes: list[CallNode] = []
@@ -184,16 +235,19 @@ def _build_call_graph(
             module=mod,
             lineno=info["lineno"],
             node_type=node_type,
-            side_effects=list(set(info["side_effects"])),
+            side_effects=sorted(info["side_effects"]),
         )
         call_nodes.append(cn)
-        G.add_node(qname, **cn.model_dump())
 
-    # Build edges — match call names to known function ids
-    fn_names = {n.name: n.id for n in call_nodes}
+    # Build edges — match call names to known function ids. Short names can repeat
+    # across modules, so keep every id and prefer one in the caller's own module.
+    fn_names: dict[str, list[str]] = defaultdict(list)
+    for n in call_nodes:
+        fn_names[n.name].append(n.id)
     call_edges: list[CallEdge] = []
 
     for qname, info in all_functions.items():
+        caller_mod = qname.rpartition(".")[0]
         for callee_name in info["calls"]:
             # Clean up callee name (e.g., self.process_payment -> process_payment)
             clean_name = callee_name
@@ -203,16 +257,23 @@ def _build_call_graph(
                 clean_name = callee_name[4:]
 
             # Try exact qname match first, then short name
-            callee_id = callee_name if callee_name in G else fn_names.get(clean_name)
+            if callee_name in all_functions:
+                callee_id = callee_name
+            else:
+                candidates = fn_names.get(clean_name)
+                callee_id = next(
+                    (c for c in candidates if c.rpartition(".")[0] == caller_mod),
+                    candidates[-1],  # no local match: last definition, as before
+                ) if candidates else None
             if callee_id and callee_id != qname:
-                G.add_edge(qname, callee_id)
+                succ.setdefault(qname, {})[callee_id] = None
                 call_edges.append(CallEdge(
                     source=qname,
                     target=callee_id,
                     call_type="direct",
                 ))
 
-    return G, call_nodes, call_edges
+    return succ, call_nodes, call_edges
 
 
 def _find_entrypoints(nodes: list[CallNode]) -> list[str]:
@@ -220,73 +281,89 @@ def _find_entrypoints(nodes: list[CallNode]) -> list[str]:
 
 
 def _find_side_effect_paths(
-    G: nx.DiGraph,
+    succ: dict[str, dict[str, None]],
     nodes: list[CallNode],
     entrypoints: list[str],
+    max_depth: int = 8,
+    max_paths: int = 20,  # cap for demo
 ) -> list[list[str]]:
+    """
+    One shortest example path from each entrypoint to every side-effect node it
+    reaches within max_depth calls. A depth-bounded BFS with parent pointers per
+    entrypoint is O(V+E), where enumerating all simple paths is exponential.
+    """
     se_nodes = {n.id for n in nodes if n.side_effects}
     paths: list[list[str]] = []
 
     for ep in entrypoints:
-        if ep not in G:
+        if ep not in succ:
             continue
-        for se_node in se_nodes:
-            if se_node not in G:
+        parent: dict[str, Optional[str]] = {ep: None}
+        frontier = deque([(ep, 0)])
+        while frontier:
+            node, depth = frontier.popleft()
+            if depth == max_depth:
                 continue
-            try:
-                for path in nx.all_simple_paths(G, ep, se_node, cutoff=8):
-                    paths.append(path)
-                    if len(paths) >= 20:  # cap for demo
+            for callee in succ.get(node, ()):
+                if callee in parent:
+                    continue
+                parent[callee] = node
+                frontier.append((callee, depth + 1))
+                if callee in se_nodes:
+                    path = [callee]
+                    while parent[path[-1]] is not None:
+                        path.append(parent[path[-1]])
+                    paths.append(path[::-1])
+                    if len(paths) >= max_paths:
                         return paths
-            except nx.NetworkXError:
-                continue
 
     return paths
 
 
-def _file_to_module(py_file: Path, repo_root: str) -> str:
-    rel = py_file.relative_to(repo_root)
-    parts = list(rel.parts)
-    if parts[-1] == "__init__.py":
-        parts = parts[:-1]
-    else:
-        parts[-1] = parts[-1].replace(".py", "")
-    return ".".join(parts) if parts else "root"
+def _file_to_module(py_file: str, root_prefix: str) -> str:
+    """
+    Dotted module name by plain string ops. root_prefix is the repo path with a
+    trailing separator, computed once per walk; iter_py_files' paths start with it.
+    """
+    rel = py_file[len(root_prefix):] if py_file.startswith(root_prefix) else os.path.relpath(py_file, root_prefix)
+    mod = rel.removesuffix(".py").replace(os.sep, ".")
+    if mod == "__init__":
+        return "root"
+    return mod.removesuffix(".__init__")
+
+
 def _regex_extract_functions(source: str, module_name: str) -> dict[str, dict]:
-    """Fallback to find functions via regex when AST fails on legacy code."""
+    """
+    Fallback to find functions via regex when AST fails on legacy code.
+    A function's body runs until the next column-0 line that isn't a comment,
+    so several defs (a class's methods) can be open at once. One pass over the
+    lines scans each line once and credits it to every open function.
+    """
     funcs = {}
-    # Simple regex for 'def func_name(args):'
-    pattern = re.compile(r"^\s*def\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\(", re.MULTILINE)
-    
-    # Regex for 'self.method(' or 'func('
-    call_pattern = re.compile(r"([a-zA-Z_][a-zA-Z0-9_\.]*)\s*\(")
-    
+    open_fns: list[dict] = []
     for i, line in enumerate(source.splitlines()):
-        match = pattern.match(line)
+        stripped = line.strip()
+        if stripped and not line.startswith(" ") and not stripped.startswith("#"):
+            open_fns = []
+
+        if open_fns:
+            # Extract calls and side effects
+            calls = [
+                c for c in (m.group(1) for m in _CALL_RE.finditer(line))
+                if c not in _NOT_CALLS
+            ]
+            effects = _side_effects_in(line)
+            for info in open_fns:
+                info["calls"].extend(calls)
+                info["side_effects"].update(effects)
+
+        match = _DEF_RE.match(line)
         if match:
-            fn_name = match.group(1)
-            qname = f"{module_name}.{fn_name}"
-            funcs[qname] = {
+            info = {
                 "lineno": i + 1,
                 "calls": [],
-                "side_effects": [],
+                "side_effects": set(),
             }
-            # Look for obvious side effects and calls in the following lines
-            body_start = i + 1
-            for j in range(body_start, len(source.splitlines())):
-                l = source.splitlines()[j]
-                if l.strip() and not l.startswith(" "):
-                    if not l.strip().startswith("#"): # check if it's really end of indent
-                        break 
-                
-                # Extract calls
-                for c_match in call_pattern.finditer(l):
-                    c_name = c_match.group(1)
-                    if c_name not in {"def", "if", "for", "while", "print"}:
-                        funcs[qname]["calls"].append(c_name)
-
-                # Extract side effects
-                for effect_type, patterns in SIDE_EFFECT_PATTERNS.items():
-                    if any(p in l for p in patterns):
-                        funcs[qname]["side_effects"].append(effect_type)
+            funcs[f"{module_name}.{match.group(1)}"] = info
+            open_fns.append(info)
     return funcs
@@ -14,8 +14,10 @@ import hashlib
 import json
 import os
 import sqlite3
+import threading
 from contextlib import contextmanager
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
@@ -85,61 +87,92 @@ CREATE TABLE IF NOT EXISTS function_sigs (
     FOREIGN KEY (repo_id) REFERENCES repos(repo_id)
 );
 
-CREATE INDEX IF NOT EXISTS idx_runs_repo     ON pipeline_runs(repo_id);
-CREATE INDEX IF NOT EXISTS idx_drifts_repo   ON drift_patterns(repo_id);
-CREATE INDEX IF NOT EXISTS idx_funcsigs_repo ON function_sigs(repo_id, function_name);
-CREATE INDEX IF NOT EXISTS idx_docgen_repo   ON docgen_runs(repo_id);
+-- Composite indexes match the actual WHERE + ORDER BY shapes; the single-column
+-- ones they supersede are dropped so writes don't maintain both
+DROP INDEX IF EXISTS idx_runs_repo;
+DROP INDEX IF EXISTS idx_drifts_repo;
+CREATE INDEX IF NOT EXISTS idx_runs_repo_ran    ON pipeline_runs(repo_id, ran_at);
+CREATE INDEX IF NOT EXISTS idx_drifts_key       ON drift_patterns(repo_id, function_name, description);
+CREATE INDEX IF NOT EXISTS idx_funcsigs_repo    ON function_sigs(repo_id, function_name);
+CREATE INDEX IF NOT EXISTS idx_docgen_repo      ON docgen_runs(repo_id);
+CREATE INDEX IF NOT EXISTS idx_docgen_session   ON docgen_runs(session_id);
+CREATE INDEX IF NOT EXISTS idx_docgen_approved  ON docgen_runs(repo_id, reviewed_at)
+    WHERE approval_status = 'approved';
 """
 
 
 def init_db(path: str = DB_PATH) -> None:
     with sqlite3.connect(path) as conn:
+        # WAL is persistent on the file: readers stop blocking the pipeline's writes.
+        # SQLite answers with the mode it actually got (e.g. not on read-only mounts).
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if mode != "wal":
+            print(f"[db] ⚠ journal_mode is {mode}, not wal — readers will block on writes")
         conn.executescript(SCHEMA)
 
 
+# One open connection per (thread, db file). API handlers run on asyncio's
+# reused worker threads and graph nodes on LangGraph's, so connections live
+# as long as those threads instead of being reopened for every query.
+_local = threading.local()
+
+
+def _thread_conn(path: str) -> sqlite3.Connection:
+    conns = _local.__dict__.setdefault("conns", {})
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        # Per-connection: fsync at checkpoints only (safe under WAL), wait on locks, temp tables in RAM
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")   # ~20 MB page cache (default is ~2 MB)
+        conns[path] = conn
+    return conn
+
+
 @contextmanager
 def get_conn(path: str = DB_PATH):
-    conn = sqlite3.connect(path)
-    conn.row_factory = sqlite3.Row
+    """One transaction on this thread's pooled connection — committed on exit, rolled back on error."""
+    conn = _thread_conn(path)
     try:
         yield conn
         conn.commit()
     except Exception:
         conn.rollback()
         raise
-    finally:
-        conn.close()
 
 
 def _now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+@lru_cache(maxsize=256)
+def _canonical(repo_path: str) -> str:
+    # resolve() stats every path component; every db call re-derives this
+    return str(Path(repo_path).resolve())
+
+
+@lru_cache(maxsize=256)
 def repo_id(repo_path: str) -> str:
     """Stable identifier for a repo — sha256 of its canonical path."""
-    canonical = str(Path(repo_path).resolve())
-    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+    return hashlib.sha256(_canonical(repo_path).encode()).hexdigest()[:16]
 
 
 # ─── Repo ─────────────────────────────────────────────────────────────────────
 
+# Insert-or-bump in one statement, so SQLite does the existence check itself
+# instead of a SELECT round trip followed by an UPDATE or INSERT
+_UPSERT_REPO = """INSERT INTO repos (repo_id, path, first_seen, last_seen, run_count) VALUES (?,?,?,?,1)
+                  ON CONFLICT(repo_id) DO UPDATE SET last_seen = excluded.last_seen, run_count = run_count + 1"""
+
+
 def upsert_repo(repo_path: str) -> str:
     rid = repo_id(repo_path)
     now = _now()
     with get_conn() as conn:
-        existing = conn.execute(
-            "SELECT repo_id FROM repos WHERE repo_id = ?", (rid,)
-        ).fetchone()
-        if existing:
-            conn.execute(
-                "UPDATE repos SET last_seen = ?, run_count = run_count + 1 WHERE repo_id = ?",
-                (now, rid)
-            )
-        else:
-            conn.execute(
-                "INSERT INTO repos (repo_id, path, first_seen, last_seen, run_count) VALUES (?,?,?,?,1)",
-                (rid, str(Path(repo_path).resolve()), now, now)
-            )
+        conn.execute(_UPSERT_REPO, (rid, _canonical(repo_path), now, now))
     return rid
 
 
@@ -152,6 +185,17 @@ def get_repo(repo_path: str) -> Optional[dict]:
 
 # ─── Pipeline runs ────────────────────────────────────────────────────────────
 
+def _changes_json(changes: list) -> str:
+    """
+    JSON for the patch_summary column. PatchChange models serialise straight
+    to JSON via pydantic-core, skipping the model_dump → dict → dumps detour.
+    """
+    return "[" + ",".join(
+        c.model_dump_json() if hasattr(c, "model_dump_json") else json.dumps(c)
+        for c in changes
+    ) + "]"
+
+
 def save_pipeline_run(
     session_id: str,
     repo_path: str,
@@ -162,14 +206,17 @@ def save_pipeline_run(
 ) -> str:
     import uuid
     run_id = str(uuid.uuid4())[:8]
-    rid    = upsert_repo(repo_path)
+    rid    = repo_id(repo_path)
+    now    = _now()
+    # Repo bump and run row commit together
     with get_conn() as conn:
+        conn.execute(_UPSERT_REPO, (rid, _canonical(repo_path), now, now))
         conn.execute(
             """INSERT INTO pipeline_runs
                (run_id, repo_id, session_id, ran_at, verdict, preservation_pct, critical_drifts, patch_summary)
                VALUES (?,?,?,?,?,?,?,?)""",
-            (run_id, rid, session_id, _now(), verdict, preservation_pct,
-             critical_drifts, json.dumps(patch_changes or []))
+            (run_id, rid, session_id, now, verdict, preservation_pct,
+             critical_drifts, _changes_json(patch_changes or []))
         )
     return run_id
 
@@ -217,6 +264,49 @@ def save_drift(
             )
 
 
+def save_drifts(repo_path: str, drifts: list[dict]) -> None:
+    """
+    save_drift for a whole validation run: one connection, one transaction,
+    one lookup of the repo's existing patterns, then executemany for the
+    counter bumps and the new rows. Same dedup semantics as calling
+    save_drift per item, including repeats within the batch.
+    """
+    import uuid
+    if not drifts:
+        return
+    rid = repo_id(repo_path)
+    now = _now()
+    with get_conn() as conn:
+        known = {
+            (r["function_name"], r["description"]): r["pattern_id"]
+            for r in conn.execute(
+                "SELECT pattern_id, function_name, description FROM drift_patterns WHERE repo_id=?",
+                (rid,)
+            )
+        }
+        bumps, inserts = [], []
+        for d in drifts:
+            key = (d["function_name"], d["description"])
+            pattern_id = known.get(key)
+            if pattern_id:
+                bumps.append((now, pattern_id))
+            else:
+                pattern_id = str(uuid.uuid4())[:8]
+                known[key] = pattern_id
+                inserts.append((pattern_id, rid, d["function_name"], d["severity"], d["description"],
+                                d.get("before_output", ""), d.get("after_output", ""), now))
+        conn.executemany(
+            """INSERT INTO drift_patterns
+               (pattern_id, repo_id, function_name, severity, description, before_output, after_output, observed_at)
+               VALUES (?,?,?,?,?,?,?,?)""",
+            inserts
+        )
+        conn.executemany(
+            "UPDATE drift_patterns SET times_seen = times_seen + 1, observed_at = ? WHERE pattern_id = ?",
+            bumps
+        )
+
+
 def get_drift_patterns(repo_path: str) -> list[dict]:
     rid = repo_id(repo_path)
     with get_conn() as conn:
@@ -227,6 +317,22 @@ def get_drift_patterns(repo_path: str) -> list[dict]:
     return [dict(r) for r in rows]
 
 
+def get_run_and_drift_history(repo_path: str, limit: int = 10) -> tuple[list[dict], list[dict]]:
+    """Pipeline history + drift patterns read in one connection and one read transaction."""
+    rid = repo_id(repo_path)
+    with get_conn() as conn:
+        conn.execute("BEGIN")
+        runs = conn.execute(
+            "SELECT * FROM pipeline_runs WHERE repo_id = ? ORDER BY ran_at DESC LIMIT ?",
+            (rid, limit)
+        ).fetchall()
+        drifts = conn.execute(
+            "SELECT * FROM drift_patterns WHERE repo_id = ? ORDER BY times_seen DESC",
+            (rid,)
+        ).fetchall()
+    return [dict(r) for r in runs], [dict(r) for r in drifts]
+
+
 # ─── Function signatures ──────────────────────────────────────────────────────
 
 def upsert_function_sig(
@@ -275,6 +381,66 @@ def upsert_function_sig(
     return {"changed": bool(changed), "previous": previous}
 
 
+def upsert_function_sigs(repo_path: str, functions: list[dict]) -> list[dict]:
+    """
+    upsert_function_sig for a whole scan in one transaction. Existing snapshots
+    are read with one SELECT, then the updates and inserts go through
+    executemany. Returns one {"changed", "previous"} per input, in order, with
+    the same semantics as calling upsert_function_sig for each in turn
+    (repeated names see the row written by their predecessor).
+    """
+    import uuid
+    if not functions:
+        return []
+    rid = repo_id(repo_path)
+    now = _now()
+    with get_conn() as conn:
+        known = {
+            r["function_name"]: dict(r)
+            for r in conn.execute("SELECT * FROM function_sigs WHERE repo_id=?", (rid,))
+        }
+        results, inserts, updates = [], {}, {}
+        for f in functions:
+            name, side_effects = f["function_name"], f["side_effects"]
+            snapshot_hash = hashlib.sha256(
+                f"{f['signature']}{f['return_type']}{sorted(side_effects)}".encode()
+            ).hexdigest()[:12]
+            previous = known.get(name)
+            results.append({
+                "changed":  bool(previous and previous["snapshot_hash"] != snapshot_hash),
+                "previous": previous,
+            })
+            row = {
+                "sig_id":        previous["sig_id"] if previous else str(uuid.uuid4())[:8],
+                "repo_id":       rid,
+                "function_name": name,
+                "signature":     f["signature"],
+                "return_type":   f["return_type"],
+                "side_effects":  json.dumps(side_effects),
+                "complexity":    f["complexity"],
+                "snapshot_hash": snapshot_hash,
+                "last_seen":     now,
+            }
+            known[name] = row
+            # A name first seen in this batch stays an insert, just with its latest values
+            (inserts if name in inserts or not previous else updates)[name] = row
+
+        conn.executemany(
+            """INSERT INTO function_sigs
+               (sig_id, repo_id, function_name, signature, return_type, side_effects, complexity, snapshot_hash, last_seen)
+               VALUES (:sig_id, :repo_id, :function_name, :signature, :return_type, :side_effects, :complexity, :snapshot_hash, :last_seen)""",
+            list(inserts.values())
+        )
+        conn.executemany(
+            """UPDATE function_sigs
+               SET signature=:signature, return_type=:return_type, side_effects=:side_effects,
+                   complexity=:complexity, snapshot_hash=:snapshot_hash, last_seen=:last_seen
+               WHERE repo_id=:repo_id AND function_name=:function_name""",
+            list(updates.values())
+        )
+    return results
+
+
 def get_function_sigs(repo_path: str) -> list[dict]:
     rid = repo_id(repo_path)
     with get_conn() as conn:
@@ -0,0 +1,133 @@
+"""
+storage/llm_cache.py — exact-match cache for LLM responses
+
+Keyed by sha256(schema version + model + prompt parts). Values are the parsed
+JSON-able result of the call, so unparseable responses never get cached.
+Re-runs and retries over unchanged inputs skip the network entirely.
+
+Usage:
+    from storage import llm_cache
+    key  = llm_cache.cache_key(model, system_prompt, user_prompt)
+    data = llm_cache.get_or_call(key, lambda: parse_json_robust(call_llm()))
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Optional
+
+CACHE_PATH = os.environ.get("BLOC_LLM_CACHE_PATH", "./bloc_llm_cache.db")
+
+# Bump when prompt/response shapes change so stale entries stop matching
+SCHEMA_VERSION = 1
+
+_MISS = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    cache_key   TEXT PRIMARY KEY,
+    response    TEXT NOT NULL,      -- JSON-encoded result
+    created_at  REAL NOT NULL       -- unix seconds
+);
+"""
+
+
+def _enabled() -> bool:
+    return os.environ.get("BLOC_LLM_CACHE", "1") != "0"
+
+
+def _ttl_seconds() -> float:
+    return float(os.environ.get("BLOC_LLM_CACHE_TTL_DAYS", "7")) * 86400
+
+
+def init_cache(path: str = CACHE_PATH) -> None:
+    with sqlite3.connect(path) as conn:
+        # Concurrent testgen/migrator calls hit the cache from many threads at once;
+        # under WAL their lookups don't queue behind each other's puts
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+
+@contextmanager
+def _conn(path: str = CACHE_PATH):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def cache_key(model: str, *parts: str) -> str:
+    h = hashlib.sha256(f"v{SCHEMA_VERSION}\0{model}".encode())
+    for part in parts:
+        h.update(b"\0")
+        h.update(part.encode("utf-8", "replace"))
+    return h.hexdigest()
+
+
+def get(key: str) -> Any:
+    """Return the cached value, or the module-private _MISS sentinel."""
+    if not _enabled():
+        return _MISS
+    try:
+        with _conn() as conn:
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE cache_key = ?", (key,)
+            ).fetchone()
+    except sqlite3.Error:
+        return _MISS
+    if not row or time.time() - row[1] > _ttl_seconds():
+        return _MISS
+    return json.loads(row[0])
+
+
+def put(key: str, value: Any) -> None:
+    if not _enabled():
+        return
+    try:
+        with _conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (cache_key, response, created_at) VALUES (?,?,?)",
+                (key, json.dumps(value), time.time()),
+            )
+    except sqlite3.Error as e:
+        print(f"[llm_cache] ⚠ Cache write failed (non-fatal): {e}")
+
+
+def get_or_call(
+    key: str,
+    fn: Callable[[], Any],
+    should_cache: Optional[Callable[[Any], bool]] = None,
+) -> Any:
+    cached = get(key)
+    if cached is not _MISS:
+        return cached
+    value = fn()
+    if value is not None and (should_cache is None or should_cache(value)):
+        put(key, value)
+    return value
+
+
+async def aget_or_call(
+    key: str,
+    fn: Callable[[], Awaitable[Any]],
+    should_cache: Optional[Callable[[Any], bool]] = None,
+) -> Any:
+    cached = get(key)
+    if cached is not _MISS:
+        return cached
+    value = await fn()
+    if value is not None and (should_cache is None or should_cache(value)):
+        put(key, value)
+    return value
+
+
+# ─── Init on import ───────────────────────────────────────────────────────────
+init_cache()
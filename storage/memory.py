@@ -4,8 +4,9 @@ storage/memory.py — Unified memory interface for B.LOC agents
 This is the single import nodes use. They don't touch db.py or vector_store.py directly.
 
 Usage:
-    from storage.memory import RepoMemory
+    from storage.memory import RepoMemory, get_repo_memory
     mem = RepoMemory(repo_path)
+    mem = get_repo_memory(repo_path)         → shared instance for hot paths
 
     # Store
     mem.record_run(session_id, verdict, pct, drifts, changes)
@@ -23,14 +24,22 @@ Usage:
     mem.search_biz_logic("payment cap")      → relevant biz rules
     mem.search_docs("quick start examples")  → from approved docs
     mem.proactive_warnings(patch_changes)    → "seen this before" drift warnings
+    mem.snapshot(patch_changes)              → (warnings, past_runs, known_drifts) in one read
 """
 
 from __future__ import annotations
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Optional
 
 from storage import db, vector_store
 
+# Long-lived pool for the independent vector lookups. Reusing its threads keeps
+# their per-thread state (db connections included) warm across calls.
+_LOOKUP_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bloc-memory")
+
 
 class RepoMemory:
     def __init__(self, repo_path: str):
@@ -82,30 +91,42 @@ class RepoMemory:
             "observed_at":   "",
         })
 
+    def record_drifts(self, drifts: list[dict]) -> None:
+        """Batch record_drift: one SQLite transaction and one vector upsert."""
+        rows = [{
+            "function_name": d["function_name"],
+            "severity":      d["severity"],
+            "description":   d["description"],
+            "before_output": d.get("before_output") or "",
+            "after_output":  d.get("after_output") or "",
+            "observed_at":   "",
+        } for d in drifts]
+        db.save_drifts(self.repo_path, rows)
+        vector_store.index_drifts(self.repo_id, rows)
+
     def record_functions(self, functions: list) -> list[dict]:
         """
         Upsert function signatures. Returns list of changed functions:
         [{"name": "...", "previous_sig": "...", "new_sig": "..."}]
         """
-        changed = []
-        fn_dicts = []
-        for f in functions:
-            fn_dict = f.model_dump() if hasattr(f, "model_dump") else dict(f)
-            result  = db.upsert_function_sig(
-                repo_path=self.repo_path,
-                function_name=fn_dict["name"],
-                signature=fn_dict["signature"],
-                return_type=fn_dict.get("returns", "") or "",
-                side_effects=fn_dict.get("side_effects", []),
-                complexity=fn_dict.get("complexity", "low"),
-            )
-            if result["changed"] and result["previous"]:
-                changed.append({
-                    "name":         fn_dict["name"],
-                    "previous_sig": result["previous"]["signature"],
-                    "new_sig":      fn_dict["signature"],
-                })
-            fn_dicts.append(fn_dict)
+        fn_dicts = [f.model_dump() if hasattr(f, "model_dump") else dict(f) for f in functions]
+        results  = db.upsert_function_sigs(self.repo_path, [{
+            "function_name": fn_dict["name"],
+            "signature":     fn_dict["signature"],
+            "return_type":   fn_dict.get("returns", "") or "",
+            "side_effects":  fn_dict.get("side_effects", []),
+            "complexity":    fn_dict.get("complexity", "low"),
+        } for fn_dict in fn_dicts])
+
+        changed = [
+            {
+                "name":         fn_dict["name"],
+                "previous_sig": result["previous"]["signature"],
+                "new_sig":      fn_dict["signature"],
+            }
+            for fn_dict, result in zip(fn_dicts, results)
+            if result["changed"] and result["previous"]
+        ]
 
         vector_store.index_functions(self.repo_id, fn_dicts)
         return changed
@@ -172,20 +193,38 @@ class RepoMemory:
 
     # ── Proactive warnings ────────────────────────────────────────────────────
 
-    def proactive_warnings(self, patch_changes: list[dict]) -> list[dict]:
+    def proactive_warnings(
+        self,
+        patch_changes: list,
+        known_drifts: Optional[list[dict]] = None,
+    ) -> list[dict]:
         """
         For each function being patched, check if we've seen drifts in it before.
         Returns warnings to inject into the migrator/reporter context.
+        Changes may be dicts or PatchChange models (read by attribute, no model_dump).
+        Pass known_drifts if already fetched; otherwise they're read once up front.
         """
+        all_drifts = self.known_drifts() if known_drifts is None else known_drifts
+        targets = [
+            (change.get("file", ""), change.get("description", "")) if isinstance(change, dict)
+            else (change.file, change.description)
+            for change in patch_changes
+        ]
+        # The per-change similarity lookups are independent — run them side by side
+        if len(targets) > 1:
+            similar_by_change = list(_LOOKUP_POOL.map(lambda t: self.search_drifts(t[1], n=3), targets))
+        else:
+            similar_by_change = [self.search_drifts(desc, n=3) for _, desc in targets]
+
         warnings = []
-        for change in patch_changes:
-            fn_name = change.get("file", "").split("/")[-1].replace(".py", "")
-            desc    = change.get("description", "")
+        warned   = set()    # functions already warned about, for the RAG dedup check
+        for (file, desc), similar in zip(targets, similar_by_change):
+            fn_name = file.split("/")[-1].replace(".py", "")
 
             # Check structured DB first
-            all_drifts = self.known_drifts()
             for d in all_drifts:
                 if d["function_name"] in desc or fn_name in d["function_name"]:
+                    warned.add(d["function_name"])
                     warnings.append({
                         "source":       "memory",
                         "function":     d["function_name"],
@@ -195,10 +234,10 @@ class RepoMemory:
                     })
 
             # Semantic similarity check
-            similar = self.search_drifts(desc, n=3)
             for s in similar:
                 meta = s.get("metadata", {})
-                if meta.get("function_name") not in [w["function"] for w in warnings]:
+                if meta.get("function_name") not in warned:
+                    warned.add(meta.get("function_name", "unknown"))
                     warnings.append({
                         "source":   "rag",
                         "function": meta.get("function_name", "unknown"),
@@ -217,14 +256,25 @@ class RepoMemory:
 
         return dedup
 
+    def snapshot(self, patch_changes: list, limit: int = 10) -> tuple[list[dict], list[dict], list[dict]]:
+        """
+        (warnings, past_runs, known_drifts) for a risk check: history and drifts come
+        from one DB read, and the drifts are reused for the warning scan.
+        """
+        past_runs, known_drifts = db.get_run_and_drift_history(self.repo_path, limit)
+        warnings = self.proactive_warnings(patch_changes, known_drifts=known_drifts)
+        return warnings, past_runs, known_drifts
+
     def memory_context_for_writer(self, topic: str) -> str:
         """
         Build a context block the writer/QA agents inject into their prompts.
         Pulls biz logic + relevant doc chunks for the given topic.
         """
-        biz   = self.search_biz_logic(topic, n=5)
-        docs  = self.search_docs(topic, n=3)
-        runs  = self.past_runs(limit=3)
+        # The two vector queries overlap; the SQLite read stays on this thread's connection
+        biz_f  = _LOOKUP_POOL.submit(self.search_biz_logic, topic, 5)
+        docs_f = _LOOKUP_POOL.submit(self.search_docs, topic, 3)
+        runs   = self.past_runs(3)
+        biz, docs = biz_f.result(), docs_f.result()
 
         lines = []
 
@@ -248,3 +298,22 @@ class RepoMemory:
                 )
 
         return "\n".join(lines) if lines else ""
+
+
+# ─── Shared instances ─────────────────────────────────────────────────────────
+
+_memory_lock = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def _cached_repo_memory(repo_path: str) -> RepoMemory:
+    return RepoMemory(repo_path)
+
+
+def get_repo_memory(repo_path: str) -> RepoMemory:
+    """
+    One RepoMemory per repo_path, reused across calls. The lock stops two
+    threads racing on a cold entry from both running upsert_repo.
+    """
+    with _memory_lock:
+        return _cached_repo_memory(repo_path)
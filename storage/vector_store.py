@@ -14,6 +14,10 @@ Collections per repo:
 
 import os
 import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Optional
 
 # ─── ChromaDB Fallback Logic ──────────────────────────────────────────────────
@@ -30,6 +34,20 @@ CHROMA_PATH = os.environ.get("BLOC_CHROMA_PATH", "./bloc_chroma")
 
 _client: Optional[object] = None
 
+# get_collection_stats results per repo, dropped whenever that repo is written to
+_stats_cache: dict[str, dict] = {}
+
+# Retrieval results per repo, keyed (kind, folded query, n); same invalidation.
+# Agents re-ask near-identical questions ("fee calculation" / "Fee  calculation"),
+# so queries are case- and whitespace-folded before lookup.
+_QUERY_CACHE_SIZE = 256
+_query_cache: dict[str, "OrderedDict[tuple[str, str, int], list[dict]]"] = {}
+_query_lock = threading.Lock()
+
+# Bumped per repo on every invalidation (under _query_lock). A fill computed
+# before a write lands only if the generation it started from is still current.
+_cache_gen: dict[str, int] = {}
+
 
 def _get_client():
     global _client
@@ -66,14 +84,17 @@ class FallbackCollection:
             try:
                 self.data = json.loads(self.path.read_text())
             except: pass
+        # id → row, so upserts hit existing rows directly instead of scanning ids
+        self._pos = {i: k for k, i in enumerate(self.data["ids"])}
 
     def upsert(self, documents, ids, metadatas):
         for d, i, m in zip(documents, ids, metadatas):
-            if i in self.data["ids"]:
-                idx = self.data["ids"].index(i)
+            idx = self._pos.get(i)
+            if idx is not None:
                 self.data["documents"][idx] = d
                 self.data["metadatas"][idx] = m
             else:
+                self._pos[i] = len(self.data["ids"])
                 self.data["documents"].append(d)
                 self.data["ids"].append(i)
                 self.data["metadatas"].append(m)
@@ -108,19 +129,36 @@ def _ef():
     return None
 
 
+def warm_up() -> None:
+    """
+    Open the client and run one throwaway embedding, so the ONNX model load
+    (and first-run download) happens at startup rather than inside the first
+    retrieval a user waits on.
+    """
+    _get_client()
+    ef = _ef()
+    if ef is not None:
+        ef(["warmup"])
+
+
 def _col(repo_id: str, kind: str):
     name = f"{repo_id}_{kind}"[:63]
     return _get_client().get_or_create_collection(name=name)
 
 
-from pathlib import Path
+def _invalidate_caches(repo_id: str) -> None:
+    with _query_lock:
+        _cache_gen[repo_id] = _cache_gen.get(repo_id, 0) + 1
+        _stats_cache.pop(repo_id, None)
+        _query_cache.pop(repo_id, None)
+
 
 # ─── Index functions ──────────────────────────────────────────────────────────
 
 def index_functions(repo_id: str, functions: list[dict]) -> None:
-    col = _col(repo_id, "functions")
     if not functions:
         return
+    col = _col(repo_id, "functions")
 
     docs, ids, metas = [], [], []
     for f in functions:
@@ -143,6 +181,7 @@ def index_functions(repo_id: str, functions: list[dict]) -> None:
         })
 
     col.upsert(documents=docs, ids=ids, metadatas=metas)
+    _invalidate_caches(repo_id)
 
 
 def index_drift(repo_id: str, drift: dict) -> None:
@@ -160,6 +199,31 @@ def index_drift(repo_id: str, drift: dict) -> None:
         ids=[drift_id],
         metadatas=[{"function_name": drift["function_name"], "severity": drift["severity"]}]
     )
+    _invalidate_caches(repo_id)
+
+
+def index_drifts(repo_id: str, drifts: list[dict]) -> None:
+    """index_drift for a batch — one upsert, one cache invalidation."""
+    if not drifts:
+        return
+    # Ids collide for repeated drifts; keep the last, as sequential upserts would
+    by_id = {}
+    for drift in drifts:
+        text = (
+            f"Drift in function: {drift['function_name']}\n"
+            f"Severity: {drift['severity']}\n"
+            f"Description: {drift['description']}\n"
+            f"Before: {drift.get('before_output', '')}\n"
+            f"After: {drift.get('after_output', '')}"
+        )
+        drift_id = f"drift_{repo_id}_{drift['function_name']}_{drift.get('observed_at','')[:10]}"
+        by_id[drift_id] = (text, {"function_name": drift["function_name"], "severity": drift["severity"]})
+    _col(repo_id, "drifts").upsert(
+        documents=[t for t, _ in by_id.values()],
+        ids=list(by_id),
+        metadatas=[m for _, m in by_id.values()],
+    )
+    _invalidate_caches(repo_id)
 
 
 def index_biz_logic(repo_id: str, hints: list[str]) -> None:
@@ -172,28 +236,81 @@ def index_biz_logic(repo_id: str, hints: list[str]) -> None:
         ids.append(f"biz_{repo_id}_{i}_{hash(hint) % 99999}")
         metas.append({"type": "biz_logic"})
     col.upsert(documents=docs, ids=ids, metadatas=metas)
+    _invalidate_caches(repo_id)
+
+
+_DOC_CHUNK_SIZE    = 500
+_DOC_CHUNK_OVERLAP = 50
+_DOC_SEPARATORS    = ["\n\n", "\n", ". ", " "]
+
+
+def _split_units(text: str, separators: list[str]) -> list[str]:
+    """Break text into pieces <= _DOC_CHUNK_SIZE, preferring the coarsest separator that works."""
+    if len(text) <= _DOC_CHUNK_SIZE:
+        return [text]
+    if not separators:
+        return [text[i:i + _DOC_CHUNK_SIZE] for i in range(0, len(text), _DOC_CHUNK_SIZE)]
+    sep, rest = separators[0], separators[1:]
+    parts = text.split(sep)
+    units = []
+    for i, part in enumerate(parts):
+        if i < len(parts) - 1:
+            part += sep
+        if part:
+            units.extend(_split_units(part, rest))
+    return units
+
+
+def _chunk_markdown(markdown: str) -> list[str]:
+    """Pack paragraph/line/sentence units into ~500-char chunks with a short word-aligned overlap."""
+    chunks: list[str] = []
+    current = ""
+    for unit in _split_units(markdown, _DOC_SEPARATORS):
+        if current and len(current) + len(unit) > _DOC_CHUNK_SIZE:
+            chunks.append(current.strip())
+            tail = current[-_DOC_CHUNK_OVERLAP:]
+            cut  = tail.find(" ")
+            current = tail[cut + 1:] if cut != -1 else ""
+            if len(current) + len(unit) > _DOC_CHUNK_SIZE:
+                current = ""
+        current += unit
+    if current.strip():
+        chunks.append(current.strip())
+    return [c for c in chunks if c]
 
 
 def index_approved_doc(repo_id: str, session_id: str, markdown: str) -> None:
+    chunks = _chunk_markdown(markdown)
+    if not chunks:
+        return
     col = _col(repo_id, "docs")
-    chunks = [markdown[i:i+500] for i in range(0, len(markdown), 500)]
     docs, ids, metas = [], [], []
     for i, chunk in enumerate(chunks):
         docs.append(chunk)
         ids.append(f"doc_{repo_id}_{session_id}_{i}")
         metas.append({"session_id": session_id, "chunk": str(i)})
     col.upsert(documents=docs, ids=ids, metadatas=metas)
+    _invalidate_caches(repo_id)
 
 
 # ─── Retrieval ────────────────────────────────────────────────────────────────
 
-def retrieve_functions(repo_id: str, query: str, n: int = 5) -> list[dict]:
+def _retrieve(repo_id: str, kind: str, query: str, n: int) -> list[dict]:
+    key = (kind, " ".join(query.split()).casefold(), n)
+    with _query_lock:
+        cache = _query_cache.setdefault(repo_id, OrderedDict())
+        hit = cache.get(key)
+        if hit is not None:
+            cache.move_to_end(key)
+            return list(hit)
+        gen = _cache_gen.get(repo_id, 0)
     try:
-        col = _col(repo_id, "functions")
-        if col.count() == 0:
+        col = _col(repo_id, kind)
+        count = col.count()
+        if count == 0:
             return []
-        results = col.query(query_texts=[query], n_results=min(n, col.count()))
-        return [
+        results = col.query(query_texts=[query], n_results=min(n, count))
+        hits = [
             {"text": doc, "metadata": meta}
             for doc, meta in zip(
                 results["documents"][0],
@@ -202,65 +319,54 @@ def retrieve_functions(repo_id: str, query: str, n: int = 5) -> list[dict]:
         ]
     except Exception:
         return []
+    with _query_lock:
+        if _cache_gen.get(repo_id, 0) == gen:
+            cache = _query_cache.setdefault(repo_id, OrderedDict())
+            cache[key] = hits
+            if len(cache) > _QUERY_CACHE_SIZE:
+                cache.popitem(last=False)
+    return list(hits)
+
+
+def retrieve_functions(repo_id: str, query: str, n: int = 5) -> list[dict]:
+    return _retrieve(repo_id, "functions", query, n)
 
 
 def retrieve_drifts(repo_id: str, query: str, n: int = 5) -> list[dict]:
-    try:
-        col = _col(repo_id, "drifts")
-        if col.count() == 0:
-            return []
-        results = col.query(query_texts=[query], n_results=min(n, col.count()))
-        return [
-            {"text": doc, "metadata": meta}
-            for doc, meta in zip(
-                results["documents"][0],
-                results["metadatas"][0]
-            )
-        ]
-    except Exception:
-        return []
+    return _retrieve(repo_id, "drifts", query, n)
 
 
 def retrieve_biz_logic(repo_id: str, query: str, n: int = 5) -> list[dict]:
-    try:
-        col = _col(repo_id, "biz_logic")
-        if col.count() == 0:
-            return []
-        results = col.query(query_texts=[query], n_results=min(n, col.count()))
-        return [
-            {"text": doc, "metadata": meta}
-            for doc, meta in zip(
-                results["documents"][0],
-                results["metadatas"][0]
-            )
-        ]
-    except Exception:
-        return []
+    return _retrieve(repo_id, "biz_logic", query, n)
 
 
 def retrieve_doc_context(repo_id: str, query: str, n: int = 5) -> list[dict]:
+    return _retrieve(repo_id, "docs", query, n)
+
+
+_STAT_KINDS = ["functions", "drifts", "biz_logic", "docs"]
+
+# Each count is its own round trip to the Chroma backend; one long-lived pool issues them together
+_STATS_POOL = ThreadPoolExecutor(max_workers=len(_STAT_KINDS), thread_name_prefix="bloc-vector-stats")
+
+
+def _count(repo_id: str, kind: str) -> int:
     try:
-        col = _col(repo_id, "docs")
-        if col.count() == 0:
-            return []
-        results = col.query(query_texts=[query], n_results=min(n, col.count()))
-        return [
-            {"text": doc, "metadata": meta}
-            for doc, meta in zip(
-                results["documents"][0],
-                results["metadatas"][0]
-            )
-        ]
+        return _col(repo_id, kind).count()
     except Exception:
-        return []
+        return 0
 
 
 def get_collection_stats(repo_id: str) -> dict:
-    stats = {}
-    for kind in ["functions", "drifts", "biz_logic", "docs"]:
-        try:
-            col = _col(repo_id, kind)
-            stats[kind] = col.count()
-        except Exception:
-            stats[kind] = 0
-    return stats
+    with _query_lock:
+        cached = _stats_cache.get(repo_id)
+        if cached is not None:
+            return dict(cached)
+        gen = _cache_gen.get(repo_id, 0)
+    counts = _STATS_POOL.map(lambda kind: _count(repo_id, kind), _STAT_KINDS)
+    stats = dict(zip(_STAT_KINDS, counts))
+    with _query_lock:
+        # A write during the counts invalidated them; return them but don't cache
+        if _cache_gen.get(repo_id, 0) == gen:
+            _stats_cache[repo_id] = stats
+    return dict(stats)
@@ -0,0 +1,20 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+
+def run_coro_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Drive a coroutine to completion from sync node code.
+    LangGraph runs sync nodes in a worker thread (no loop), but the API's
+    override path calls nodes straight from the event loop — in that case
+    run the coroutine on a private loop in a helper thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(asyncio.run, coro).result()
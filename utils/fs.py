@@ -0,0 +1,81 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Collection, Iterable, Iterator, Tuple
+
+# Directories that never hold repo source we want to analyse or migrate
+SKIP_DIRS = {
+    ".venv", "venv", ".git", "node_modules", "__pycache__",
+    "_bloc_tests", ".tox", ".mypy_cache",
+}
+
+
+def iter_py_files(root: str) -> Iterator[Path]:
+    """Yield every .py file under root, pruning SKIP_DIRS before descending into them."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        for name in filenames:
+            if name.endswith(".py"):
+                yield Path(dirpath) / name
+
+
+def read_bytes(path: str) -> bytes:
+    """Whole-file read straight off the fd: one fstat-sized os.read in the common case."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        chunks = []
+        while True:
+            chunk = os.read(fd, max(size, 1 << 16))
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+    return b"".join(chunks)
+
+
+def mirror_hardlinks(src: str, dst: str, skip_dirs: Collection[str] = (),
+                     skip_files: Collection[str] = ()) -> None:
+    """
+    Recreate src's tree under dst with every file hardlinked instead of copied,
+    so mirroring costs one metadata op per file rather than a full byte copy.
+    Anything writing into dst must unlink before writing — truncating a linked
+    file in place would edit src too. Falls back to shutil.copytree when links
+    can't be made (cross-device, filesystems without hardlinks). Pass files a
+    tool will rewrite in place (reports, caches) in skip_files/skip_dirs.
+    """
+    try:
+        os.makedirs(dst, exist_ok=True)
+        stack = [(src, dst)]
+        while stack:
+            src_dir, dst_dir = stack.pop()
+            with os.scandir(src_dir) as it:
+                for entry in it:
+                    target = os.path.join(dst_dir, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in skip_dirs:
+                            os.mkdir(target)
+                            stack.append((entry.path, target))
+                    elif entry.is_symlink():
+                        # copytree semantics: copy what the link points at
+                        if entry.is_dir():
+                            shutil.copytree(entry.path, target)
+                        else:
+                            shutil.copy2(entry.path, target)
+                    elif entry.name not in skip_files:
+                        os.link(entry.path, target)
+    except OSError as e:
+        print(f"[fs] ⚠ Hardlink mirror failed ({e}), copying instead")
+        shutil.rmtree(dst, ignore_errors=True)
+        shutil.copytree(src, dst, ignore=shutil.ignore_patterns(*skip_dirs, *skip_files))
+
+
+def write_files(pairs: Iterable[Tuple[Path, str]], max_workers: int = 8) -> None:
+    """
+    Write (path, text) pairs as UTF-8 bytes on a small thread pool, so per-file
+    open/metadata latency overlaps instead of adding up. Parent dirs must exist.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        list(ex.map(lambda pc: pc[0].write_bytes(pc[1].encode("utf-8")), pairs))
@@ -2,23 +2,41 @@ import json
 import re
 import ast as py_ast
 
+from utils.llm_utils import extract_code_block
+
+# orjson is a speedup, not a requirement
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _loads(text: str):
+    """orjson when installed; stdlib for anything it rejects (NaN, >64-bit ints) or when it's absent."""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
 def parse_json_robust(text: str) -> dict:
     """Try to extract a JSON block from LLM output even if there's conversational fluff."""
     text = text.strip()
     
     # 1. Try direct parse
     try:
-        return json.loads(text)
+        return _loads(text)
     except json.JSONDecodeError:
         pass
     
     # print(f"[json_utils] Raw text for parsing: {text[:500]}...")
         
     # 2. Try to find markdown JSON block
-    match = re.search(r"```json\n?(.*?)\n?```", text, re.DOTALL)
-    if match:
+    block = extract_code_block(text, "json")
+    if block:
         try:
-            return json.loads(match.group(1).strip())
+            return _loads(block)
         except json.JSONDecodeError:
             pass
             
@@ -34,7 +52,7 @@ def parse_json_robust(text: str) -> dict:
             # Remove trailing commas in objects/arrays (common LLM mistake)
             cleaned = re.sub(r",\s*([\]}])", r"\1", cleaned)
             
-            return json.loads(cleaned)
+            return _loads(cleaned)
         except json.JSONDecodeError as e:
             print(f"[json_utils] JSON Parse Error: {e}")
             print(f"[json_utils] Attempted to parse: {cleaned[:500]}...")
@@ -42,7 +60,7 @@ def parse_json_robust(text: str) -> dict:
             # Last ditch effort: try cleaning up even more if it looks like markdown was escaped
             try:
                 second_cleaned = cleaned.replace('\\"', '"').replace('\\n', '\n')
-                return json.loads(second_cleaned)
+                return _loads(second_cleaned)
             except:
                 pass
             
@@ -0,0 +1,132 @@
+from typing import Optional
+
+
+def cached_system_message(text: str) -> dict:
+    """
+    System message with its static text marked as a prompt-cache breakpoint.
+    OpenRouter forwards `cache_control` to Anthropic/Gemini; other providers ignore it
+    and still get automatic prefix caching as long as this text stays byte-identical.
+    """
+    return {
+        "role": "system",
+        "content": [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}],
+    }
+
+
+def log_prompt_cache(tag: str, response) -> None:
+    """Print how much of the prompt the provider served from its cache (when it reports usage)."""
+    usage = getattr(response, "usage", None)
+    if not usage or not usage.prompt_tokens:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+    print(f"[{tag}] prompt cache: {cached}/{usage.prompt_tokens} tokens ({cached / usage.prompt_tokens:.0%})")
+
+
+def _fence_body(text: str, opener: str) -> Optional[str]:
+    start = text.find(opener)
+    if start == -1:
+        return None
+    start += len(opener)
+    end = text.find("```", start)
+    return text[start:end] if end != -1 else None
+
+
+def extract_code_block(text: str, lang: str = "python") -> Optional[str]:
+    """
+    Body of the first ```lang fence in an LLM reply, else the first bare ``` fence.
+    Plain str.find scans — no DOTALL regex backtracking over multi-kB replies.
+    """
+    body = _fence_body(text, f"```{lang}\n") if lang else None
+    if body is None:
+        body = _fence_body(text, "```\n")
+    return body.strip() if body is not None else None
+
+
+def function_tool(name: str, description: str, parameters: dict) -> dict:
+    """OpenAI-style function tool definition for the `tool` argument of stream_text."""
+    return {
+        "type": "function",
+        "function": {"name": name, "description": description, "parameters": parameters},
+    }
+
+
+def _force_tool(kwargs: dict, tool: dict) -> None:
+    kwargs["tools"] = [tool]
+    kwargs["tool_choice"] = {"type": "function", "function": {"name": tool["function"]["name"]}}
+
+
+def _tool_args(delta) -> Optional[str]:
+    calls = delta.tool_calls
+    return calls[0].function.arguments if calls and calls[0].function else None
+
+
+def stream_text(client, stop_at_code_block: bool = False,
+                cache_tag: Optional[str] = None, tool: Optional[dict] = None, **kwargs) -> str:
+    """
+    Run a chat completion with stream=True and return the assembled text.
+    Streaming keeps bytes flowing on long generations, so the client read timeout
+    doesn't fire on a slow-but-healthy 8k-token reply. With stop_at_code_block the
+    stream is closed as soon as the first fenced block is complete, skipping
+    whatever prose the model appends after it. With cache_tag the provider is asked
+    for a trailing usage chunk, which is passed to log_prompt_cache. With tool the
+    call is forced through that function and its streamed JSON arguments are
+    returned instead of the message text (which is the fallback if the provider
+    answers in plain content anyway).
+    """
+    if cache_tag:
+        kwargs["stream_options"] = {"include_usage": True}
+    if tool:
+        _force_tool(kwargs, tool)
+    stream = client.chat.completions.create(stream=True, **kwargs)
+    parts: list[str] = []
+    args: list[str] = []
+    try:
+        for chunk in stream:
+            if cache_tag and getattr(chunk, "usage", None):
+                log_prompt_cache(cache_tag, chunk)
+            if not chunk.choices:
+                continue
+            # Resolve the delta once; tool args and content both hang off it
+            delta = chunk.choices[0].delta
+            if tool and (arg := _tool_args(delta)):
+                args.append(arg)
+                continue
+            text = delta.content
+            if text:
+                parts.append(text)
+                if stop_at_code_block and "`" in text and extract_code_block("".join(parts)) is not None:
+                    break
+    finally:
+        stream.close()
+    return "".join(args or parts)
+
+
+async def astream_text(client, stop_at_code_block: bool = False,
+                       cache_tag: Optional[str] = None, tool: Optional[dict] = None, **kwargs) -> str:
+    """Async twin of stream_text for AsyncOpenAI clients."""
+    if cache_tag:
+        kwargs["stream_options"] = {"include_usage": True}
+    if tool:
+        _force_tool(kwargs, tool)
+    stream = await client.chat.completions.create(stream=True, **kwargs)
+    parts: list[str] = []
+    args: list[str] = []
+    try:
+        async for chunk in stream:
+            if cache_tag and getattr(chunk, "usage", None):
+                log_prompt_cache(cache_tag, chunk)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if tool and (arg := _tool_args(delta)):
+                args.append(arg)
+                continue
+            text = delta.content
+            if text:
+                parts.append(text)
+                if stop_at_code_block and "`" in text and extract_code_block("".join(parts)) is not None:
+                    break
+    finally:
+        await stream.close()
+    return "".join(args or parts)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+import openai
+
+T = TypeVar("T")
+
+# Clients are built with max_retries=0 and this timeout so retries are owned here
+LLM_TIMEOUT = float(os.environ.get("BLOC_LLM_TIMEOUT", "60"))
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+_sync_client: openai.OpenAI | None = None
+
+
+def openrouter_client() -> openai.OpenAI:
+    """
+    Process-wide sync client. Every node talks to the same host, so one
+    httpx pool keeps TLS sessions alive across nodes and runs instead of
+    each module holding its own cold pool.
+    """
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = openai.OpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=os.environ.get("OPENROUTER_API_KEY", ""),
+            timeout=LLM_TIMEOUT,
+            max_retries=0,
+        )
+    return _sync_client
+
+
+def openrouter_async_client() -> openai.AsyncOpenAI:
+    """
+    Fresh async client, to be used as `async with` inside one event loop —
+    its pool is bound to the loop, so it can't be a module singleton while
+    nodes run each fan-out under its own asyncio.run.
+    """
+    return openai.AsyncOpenAI(
+        base_url=OPENROUTER_BASE_URL,
+        api_key=os.environ.get("OPENROUTER_API_KEY", ""),
+        timeout=LLM_TIMEOUT,
+        max_retries=0,
+    )
+
+# Transient provider failures worth another attempt; bad requests/auth errors are not
+RETRYABLE = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def _backoff(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_llm(
+    fn: Callable[..., T],
+    *args: Any,
+    max_attempts: int = 3,
+    base: float = 1.0,
+    cap: float = 20.0,
+    **kwargs: Any,
+) -> T:
+    """Call fn(*args, **kwargs), retrying transient LLM errors with jittered exponential backoff."""
+    for attempt in range(max_attempts):
+        try:
+            return fn(*args, **kwargs)
+        except RETRYABLE as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = _backoff(attempt, base, cap)
+            print(f"[retry] ⚠ {type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{max_attempts - 1})")
+            time.sleep(delay)
+    raise RuntimeError("unreachable")
+
+
+async def aretry_llm(
+    fn: Callable[..., Awaitable[T]],
+    *args: Any,
+    max_attempts: int = 3,
+    base: float = 1.0,
+    cap: float = 20.0,
+    **kwargs: Any,
+) -> T:
+    """Async twin of retry_llm for AsyncOpenAI calls."""
+    for attempt in range(max_attempts):
+        try:
+            return await fn(*args, **kwargs)
+        except RETRYABLE as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = _backoff(attempt, base, cap)
+            print(f"[retry] ⚠ {type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{max_attempts - 1})")
+            await asyncio.sleep(delay)
+    raise RuntimeError("unreachable")